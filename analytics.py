@@ -0,0 +1,191 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Latency percentiles reported by SLA reports
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+def grouped_percentiles(group_index, values, group_count, percentiles=LATENCY_PERCENTILES, weights=None):
+    """Nearest-rank percentiles of `values` per group, as a (group_count, len(percentiles)) array.
+
+    `group_index` gives each value's group (0..group_count-1). With
+    `weights`, a value counts as that many observations. Groups without
+    values get NaN.
+    """
+    group_index = np.asarray(group_index, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+    result = np.full((group_count, len(percentiles)), np.nan)
+    if not len(values):
+        return result
+
+    order = np.lexsort((values, group_index))
+    group_index, values, weights = group_index[order], values[order], weights[order]
+    cumulative = np.cumsum(weights)
+    totals = np.bincount(group_index, weights=weights, minlength=group_count)
+    # Cumulative weight before each group's first value
+    offsets = np.concatenate(([0.0], np.cumsum(totals)[:-1]))
+    present = totals > 0
+
+    for column, percentile in enumerate(percentiles):
+        targets = offsets[present] + totals[present] * percentile / 100.0
+        # First value whose cumulative weight reaches the target; the small
+        # tolerance keeps exact ranks from rounding past their value
+        positions = np.searchsorted(cumulative, targets - 1e-9 * totals[present], side='left')
+        result[present, column] = values[np.minimum(positions, len(values) - 1)]
+    return result
+
+def availability(device_index, starts, ends, online, since, until, device_count):
+    """Uptime, outage and repair figures per device from status intervals.
+
+    Intervals are (start, end) Unix times with an online flag, clipped to
+    [since, until]. Time a device was not checked is left out. MTTR is the
+    mean outage duration and MTBF the online time per outage; both are NaN
+    for devices without outages in the window, as is uptime for devices
+    never observed.
+    """
+    device_index = np.asarray(device_index, dtype=np.int64)
+    online = np.asarray(online, dtype=bool)
+    durations = np.clip(
+        np.minimum(np.asarray(ends, dtype=np.float64), until) - np.maximum(np.asarray(starts, dtype=np.float64), since),
+        0, None
+    )
+
+    online_seconds = np.bincount(device_index, weights=durations * online, minlength=device_count)
+    offline_seconds = np.bincount(device_index, weights=durations * ~online, minlength=device_count)
+    outage = ~online & (durations > 0)
+    outages = np.bincount(device_index[outage], minlength=device_count)
+    longest_outage = np.zeros(device_count)
+    np.maximum.at(longest_outage, device_index[outage], durations[outage])
+    observed = online_seconds + offline_seconds
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'observed_seconds': observed,
+            'online_seconds': online_seconds,
+            'downtime_seconds': offline_seconds,
+            'uptime_percent': np.where(observed > 0, online_seconds / observed * 100, np.nan),
+            'outages': outages,
+            'longest_outage': longest_outage,
+            'mttr': np.where(outages > 0, offline_seconds / outages, np.nan),
+            'mtbf': np.where(outages > 0, online_seconds / outages, np.nan)
+        }
+
+def latency(device_index, response_times, device_count, counts=None, minimums=None, maximums=None,
+            percentiles=LATENCY_PERCENTILES):
+    """Mean, min, max and percentiles of response times per device.
+
+    Takes raw samples, or rollup buckets where `response_times` are bucket
+    averages and `counts`, `minimums` and `maximums` the buckets' sample
+    counts and extremes. Mean, min and max are exact either way; from
+    rollups the percentiles are of the bucket averages, weighted by count.
+    """
+    device_index = np.asarray(device_index, dtype=np.int64)
+    response_times = np.asarray(response_times, dtype=np.float64)
+    counts = np.ones(len(response_times)) if counts is None else np.asarray(counts, dtype=np.float64)
+    minimums = response_times if minimums is None else np.asarray(minimums, dtype=np.float64)
+    maximums = response_times if maximums is None else np.asarray(maximums, dtype=np.float64)
+
+    samples = np.bincount(device_index, weights=counts, minlength=device_count)
+    total = np.bincount(device_index, weights=response_times * counts, minlength=device_count)
+    lowest = np.full(device_count, np.inf)
+    np.minimum.at(lowest, device_index, minimums)
+    highest = np.full(device_count, -np.inf)
+    np.maximum.at(highest, device_index, maximums)
+    has_samples = samples > 0
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'samples': samples,
+            'mean': np.where(has_samples, total / samples, np.nan),
+            'min': np.where(has_samples, lowest, np.nan),
+            'max': np.where(has_samples, highest, np.nan),
+            'percentiles': grouped_percentiles(device_index, response_times, device_count, percentiles, counts)
+        }
+
+def _number(value):
+    """JSON-friendly float: None for NaN"""
+    return None if np.isnan(value) else float(value)
+
+def sla_report(devices, intervals, samples, since, until, percentiles=LATENCY_PERCENTILES):
+    """Per-device and overall uptime/latency report.
+
+    `devices` is a list of device dicts with 'id'; `intervals` a dict of
+    device_id, start, end and online arrays; `samples` a dict of device_id
+    and response_time arrays, plus count/min/max arrays when they come
+    from rollups. Rows of devices not in `devices` are ignored. Overall
+    uptime is weighted by observed time.
+    """
+    device_ids = np.array([device['id'] for device in devices], dtype=np.int64)
+    position = {device_id: index for index, device_id in enumerate(device_ids.tolist())}
+    count = len(devices)
+    sorter = np.argsort(device_ids)
+
+    def known(rows):
+        """`rows` without those of devices missing from `devices`"""
+        mask = np.isin(np.asarray(rows['device_id'], dtype=np.int64), device_ids)
+        return {key: np.asarray(value)[mask] for key, value in rows.items() if value is not None}
+
+    def index_of(ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        return sorter[np.searchsorted(device_ids, ids, sorter=sorter)] if len(ids) else ids
+
+    intervals = known(intervals)
+    samples = known(samples)
+
+    uptime = availability(
+        index_of(intervals['device_id']), intervals['start'], intervals['end'], intervals['online'],
+        since, until, count
+    )
+    sample_index = index_of(samples['device_id'])
+    response = latency(
+        sample_index, samples['response_time'], count,
+        samples.get('count'), samples.get('min'), samples.get('max'), percentiles
+    )
+    overall_response = latency(
+        np.zeros(len(sample_index), dtype=np.int64), samples['response_time'], 1,
+        samples.get('count'), samples.get('min'), samples.get('max'), percentiles
+    )
+
+    report = []
+    for device in devices:
+        index = position[device['id']]
+        report.append({
+            **device,
+            'uptime_percent': _number(uptime['uptime_percent'][index]),
+            'observed_seconds': float(uptime['observed_seconds'][index]),
+            'downtime_seconds': float(uptime['downtime_seconds'][index]),
+            'outages': int(uptime['outages'][index]),
+            'longest_outage': float(uptime['longest_outage'][index]),
+            'mttr': _number(uptime['mttr'][index]),
+            'mtbf': _number(uptime['mtbf'][index]),
+            'latency': {
+                'samples': int(response['samples'][index]),
+                'mean': _number(response['mean'][index]),
+                'min': _number(response['min'][index]),
+                'max': _number(response['max'][index]),
+                **{f'p{p}': _number(value) for p, value in zip(percentiles, response['percentiles'][index])}
+            }
+        })
+
+    observed = uptime['observed_seconds'].sum()
+    outages = int(uptime['outages'].sum())
+    with np.errstate(invalid='ignore', divide='ignore'):
+        summary = {
+            'devices': count,
+            'uptime_percent': _number(uptime['online_seconds'].sum() / observed * 100 if observed else np.nan),
+            'downtime_seconds': float(uptime['downtime_seconds'].sum()),
+            'outages': outages,
+            'mttr': _number(uptime['downtime_seconds'].sum() / outages if outages else np.nan),
+            'mtbf': _number(uptime['online_seconds'].sum() / outages if outages else np.nan),
+            'latency': {
+                'samples': int(overall_response['samples'][0]),
+                'mean': _number(overall_response['mean'][0]),
+                'min': _number(overall_response['min'][0]),
+                'max': _number(overall_response['max'][0]),
+                **{f'p{p}': _number(value) for p, value in zip(percentiles, overall_response['percentiles'][0])}
+            }
+        }
+    return {'summary': summary, 'devices': report}
@@ -1,13 +1,20 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
 from flask_socketio import SocketIO, emit
+from werkzeug.datastructures import MultiDict
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import queue
 import threading
 import time
 import logging
+from urllib.parse import parse_qsl
 
-from database import DatabaseManager
+from database import DatabaseManager, DEVICES_PER_PAGE
+from events import EventBus
+from network_stats import NetworkStatistics
 from network_scanner import NetworkScanner, DeviceMonitor
+from retention import RetentionService
+from scan_jobs import ScanJobManager, ScanQueueFull
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,19 +25,47 @@ app = Flask(__name__)
 app.secret_key = 'network_dashboard_secret_key_2024'
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# Events pushed to clients per Socket.IO message, and how long to wait for a
+# burst (e.g. a scan's results) to arrive before pushing
+EVENT_BATCH_SIZE = 500
+EVENT_BATCH_WINDOW = 0.25
+
 # Initialize components
-db = DatabaseManager()
+event_bus = EventBus()
+db = DatabaseManager(status_log_mode='compact', event_bus=event_bus)
+stats_service = NetworkStatistics(db, event_bus)
 scanner = NetworkScanner()
 monitor = DeviceMonitor(db)
+scan_jobs = ScanJobManager(scanner, db, emit=socketio.emit)
+retention_service = RetentionService(db)
 
 # Global state
-scanning_in_progress = False
+pending_events = queue.Queue()
+event_bus.subscribe(pending_events.put)
+
+@app.context_processor
+def inject_event_position():
+    """Event bus position the rendered page is current as of, for Socket.IO resync"""
+    return {'event_epoch': event_bus.epoch, 'event_seq': event_bus.current_sequence()}
+
+def device_page_args(args):
+    """Translate listing query parameters into DatabaseManager.get_devices_page arguments"""
+    group_filter = args.get('group', '')
+    return {
+        'group_id': int(group_filter) if group_filter.isdigit() else None,
+        'search': args.get('search') or None,
+        'sort': args.get('sort') or None,
+        'descending': args.get('order') == 'desc',
+        'after': args.get('after') or None,
+        'before': args.get('before') or None,
+        'limit': args.get('limit', DEVICES_PER_PAGE, type=int)
+    }
 
 @app.route('/')
 def dashboard():
     """Main dashboard page"""
-    stats = db.get_network_statistics()
-    devices = db.get_all_devices()
+    stats = stats_service.get_statistics()
+    devices = db.get_devices_page()['devices']
     groups = db.get_device_groups()
     
     return render_template('dashboard.html', 
@@ -44,19 +79,17 @@ def devices():
     search_query = request.args.get('search', '')
     group_filter = request.args.get('group', '')
     
-    if search_query:
-        devices_list = db.search_devices(search_query)
-    else:
-        devices_list = db.get_all_devices()
-    
-    # Filter by group if specified
-    if group_filter:
-        devices_list = [d for d in devices_list if str(d['group_id']) == group_filter]
+    try:
+        devices_page = db.get_devices_page(**device_page_args(request.args))
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('devices', search=search_query or None, group=group_filter or None))
     
     groups = db.get_device_groups()
     
     return render_template('devices.html', 
-                         devices=devices_list, 
+                         devices=devices_page['devices'], 
+                         pagination=devices_page,
                          groups=groups,
                          search_query=search_query,
                          group_filter=group_filter)
@@ -71,22 +104,19 @@ def device_detail(ip_address):
     
     # Get status history
     status_history = db.get_device_status_history(device['id'])
+    timeline = db.get_device_timeline(device['id'])
     groups = db.get_device_groups()
     
     return render_template('device_detail.html', 
                          device=device, 
                          status_history=status_history,
+                         timeline=timeline,
                          groups=groups)
 
 @app.route('/groups')
 def groups():
     """Device groups management page"""
-    groups_list = db.get_device_groups()
-    
-    # Get device count for each group
-    for group in groups_list:
-        devices = db.get_all_devices()
-        group['device_count'] = len([d for d in devices if d['group_id'] == group['id']])
+    groups_list = db.get_device_groups_with_counts()
     
     return render_template('groups.html', groups=groups_list)
 
@@ -98,72 +128,51 @@ def scan_page():
 # API Routes
 @app.route('/api/scan/start', methods=['POST'])
 def start_scan():
-    """Start network scan"""
-    global scanning_in_progress
-    
-    if scanning_in_progress:
-        return jsonify({'error': 'Scan already in progress'}), 400
-    
+    """Queue a network scan"""
     scan_type = request.json.get('scan_type', 'ping')
     network_range = request.json.get('network_range', None)
+    try:
+        priority = int(request.json.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'priority must be an integer'}), 400
     
-    # Start scan in background thread
-    def run_scan():
-        global scanning_in_progress
-        scanning_in_progress = True
-        
-        try:
-            socketio.emit('scan_status', {'status': 'started', 'message': f'Starting {scan_type} scan...'})
-            
-            if scan_type == 'nmap':
-                result = scanner.scan_network_nmap(network_range)
-            else:
-                result = scanner.scan_network_ping(network_range)
-            
-            # Save devices to database
-            devices_added = 0
-            for device_info in result['devices']:
-                device_id = db.add_device(
-                    device_info['ip_address'],
-                    device_info['hostname'],
-                    device_info.get('mac_address'),
-                    device_info.get('vendor'),
-                    device_info.get('device_type')
-                )
-                
-                # Log initial status
-                db.log_device_status(
-                    device_id,
-                    device_info['status'],
-                    device_info.get('response_time')
-                )
-                devices_added += 1
-                
-                # Emit progress update
-                socketio.emit('scan_progress', {
-                    'devices_found': devices_added,
-                    'current_device': device_info['ip_address']
-                })
-            
-            socketio.emit('scan_status', {
-                'status': 'completed',
-                'message': f'Scan completed! Found {devices_added} devices.',
-                'devices_found': devices_added,
-                'duration': result['duration']
-            })
-            
-        except Exception as e:
-            logger.error(f"Scan error: {e}")
-            socketio.emit('scan_status', {
-                'status': 'error',
-                'message': f'Scan failed: {str(e)}'
-            })
-        finally:
-            scanning_in_progress = False
-    
-    threading.Thread(target=run_scan, daemon=True).start()
+    try:
+        job = scan_jobs.submit(network_range, scan_type, priority)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ScanQueueFull as e:
+        return jsonify({'error': str(e)}), 429
     
-    return jsonify({'message': 'Scan started'})
+    return jsonify({'message': 'Scan queued', 'job': job.to_dict()})
+
+@app.route('/api/scan/jobs')
+def list_scan_jobs():
+    """List queued, running and recently finished scans"""
+    return jsonify([job.to_dict() for job in scan_jobs.list_jobs()])
+
+@app.route('/api/scan/jobs/<job_id>')
+def get_scan_job(job_id):
+    """Get one scan's state and progress"""
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Scan job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/scan/jobs/<job_id>/results')
+def get_scan_job_results(job_id):
+    """Get the devices a scan has found so far"""
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Scan job not found'}), 404
+    return jsonify({'job': job.to_dict(), 'devices': list(job.devices)})
+
+@app.route('/api/scan/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_scan_job(job_id):
+    """Cancel a queued or running scan"""
+    job = scan_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Scan job not found'}), 404
+    return jsonify(job.to_dict())
 
 @app.route('/api/device/<int:device_id>/update', methods=['POST'])
 def update_device(device_id):
@@ -181,6 +190,24 @@ def update_device(device_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/device/<int:device_id>/response_times')
+def get_device_response_times(device_id):
+    """Get a device's response times and uptime, at a resolution suited to the span.
+
+    Takes since/until as UTC 'YYYY-MM-DD HH:MM:SS', or hours back from now.
+    """
+    since = request.args.get('since')
+    hours = request.args.get('hours', type=float)
+    if not since and hours:
+        since = (datetime.now(timezone.utc) - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+    
+    try:
+        return jsonify(db.get_response_times(device_id, since=since, until=request.args.get('until')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/device/<ip_address>/check', methods=['POST'])
 def check_device_status(ip_address):
     """Check single device status"""
@@ -212,9 +239,13 @@ def add_group():
         group_id = db.add_device_group(
             data['name'],
             data.get('description'),
-            data.get('color', '#007bff')
+            data.get('color', '#007bff'),
+            data.get('check_interval'),
+            data.get('retention_days')
         )
         return jsonify({'message': 'Group added successfully', 'id': group_id})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -222,38 +253,75 @@ def add_group():
 def get_stats():
     """Get network statistics"""
     try:
-        stats = db.get_network_statistics()
+        stats = stats_service.get_statistics()
         return jsonify(stats)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/devices/status')
 def get_devices_status():
-    """Get current status of all devices"""
+    """Get current status of one page of devices"""
     try:
-        devices = db.get_all_devices()
-        device_status = []
-        
-        for device in devices:
-            # Get latest status
-            recent_logs = db.get_device_status_history(device['id'], limit=1)
-            latest_status = recent_logs[0] if recent_logs else None
-            
-            device_status.append({
+        page = db.get_devices_page(with_status=True, **device_page_args(request.args))
+        device_status = [
+            {
                 'id': device['id'],
                 'ip_address': device['ip_address'],
                 'hostname': device['hostname'],
                 'custom_name': device['custom_name'],
                 'is_active': bool(device['is_active']),
                 'last_seen': device['last_seen'],
-                'status': latest_status['status'] if latest_status else 'unknown',
-                'response_time': latest_status['response_time'] if latest_status else None
-            })
+                'status': device['status'] or 'unknown',
+                'response_time': device['response_time']
+            }
+            for device in page['devices']
+        ]
         
-        return jsonify(device_status)
+        return jsonify({
+            'devices': device_status,
+            'total': page['total'],
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor']
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/reports/sla')
+def get_sla_report():
+    """Uptime, outage and latency report for a device, a group or the whole network.
+
+    Takes device_id or group_id to narrow the scope, and since/until as UTC
+    'YYYY-MM-DD HH:MM:SS' or days back from now (default 30).
+    """
+    since = request.args.get('since')
+    days = request.args.get('days', type=float)
+    if not since and days:
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    
+    try:
+        return jsonify(db.get_sla_report(
+            device_id=request.args.get('device_id', type=int),
+            group_id=request.args.get('group_id', type=int),
+            since=since,
+            until=request.args.get('until')
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/monitor/status')
+def get_monitor_status():
+    """Get background monitor state and last cycle timing"""
+    return jsonify(monitor.get_status())
+
+@app.route('/api/retention/status')
+def get_retention_status():
+    """Get the status history retention schedule and last run"""
+    return jsonify(retention_service.get_status())
+
 # WebSocket events
 @socketio.on('connect')
 def handle_connect():
@@ -266,27 +334,71 @@ def handle_disconnect():
     """Handle client disconnection"""
     logger.info('Client disconnected')
 
+@socketio.on('resync')
+def handle_resync(data=None):
+    """Send a client the events it missed, or a fresh snapshot if they are gone.
+
+    data carries the client's epoch and last seen sequence, plus the listing
+    query string of the page it shows so a snapshot covers the same devices.
+    """
+    data = data or {}
+    since = data.get('since')
+    missed = event_bus.events_since(since, data.get('epoch')) if isinstance(since, int) else None
+    try:
+        if missed is not None:
+            for start in range(0, len(missed), EVENT_BATCH_SIZE):
+                emit('device_deltas', {'epoch': event_bus.epoch, 'events': missed[start:start + EVENT_BATCH_SIZE]})
+            return
+        
+        # Take the position first: events racing the reads below are re-sent
+        # and re-applied, never lost
+        seq = event_bus.current_sequence()
+        page = db.get_devices_page(**device_page_args(MultiDict(parse_qsl(data.get('query') or ''))))
+        emit('snapshot', {
+            'epoch': event_bus.epoch,
+            'seq': seq,
+            'devices': page['devices'],
+            'stats': stats_service.get_statistics()
+        })
+    except Exception as e:
+        logger.error(f"Error resyncing client: {e}")
+
 @socketio.on('request_device_status')
-def handle_device_status_request():
-    """Send current device status to client"""
+def handle_device_status_request(data=None):
+    """Send one page of device status to client; data takes the listing query parameters"""
     try:
-        devices = db.get_all_devices()
-        emit('device_status_update', {'devices': [dict(d) for d in devices]})
+        page = db.get_devices_page(**device_page_args(MultiDict(data or {})))
+        emit('device_status_update', {
+            'devices': page['devices'],
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor']
+        })
     except Exception as e:
         logger.error(f"Error sending device status: {e}")
 
 # Background tasks
-def status_update_broadcaster():
-    """Broadcast status updates to connected clients"""
+def event_broadcaster():
+    """Push device state-change deltas to connected clients as they happen"""
+    stats_stale = False
     while True:
         try:
-            if not scanning_in_progress:  # Don't broadcast during scans
-                stats = db.get_network_statistics()
-                socketio.emit('stats_update', stats)
-            time.sleep(30)  # Update every 30 seconds
+            events = [pending_events.get()]
+            stats_stale = True
+            time.sleep(EVENT_BATCH_WINDOW)
+            while len(events) < EVENT_BATCH_SIZE:
+                try:
+                    events.append(pending_events.get_nowait())
+                except queue.Empty:
+                    break
+            
+            socketio.emit('device_deltas', {'epoch': event_bus.epoch, 'events': events})
+            # Refresh statistics once a burst has drained, not per batch
+            if stats_stale and pending_events.empty():
+                socketio.emit('stats_update', stats_service.get_statistics())
+                stats_stale = False
         except Exception as e:
             logger.error(f"Error broadcasting updates: {e}")
-            time.sleep(60)
+            time.sleep(1)
 
 # Initialize background tasks
 def init_background_tasks():
@@ -294,8 +406,14 @@ def init_background_tasks():
     # Start device monitoring
     monitor.start_monitoring()
     
-    # Start status broadcaster
-    broadcaster_thread = threading.Thread(target=status_update_broadcaster, daemon=True)
+    # Re-check the in-memory statistics against the database now and then
+    stats_service.start()
+    
+    # Trim old status history in the background
+    retention_service.start()
+    
+    # Start pushing state changes to clients
+    broadcaster_thread = threading.Thread(target=event_broadcaster, daemon=True)
     broadcaster_thread.start()
     
     logger.info("Background tasks initialized")
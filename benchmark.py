@@ -0,0 +1,685 @@
+"""Benchmarks for the scanner, monitor and database hot paths.
+
+Probes go to a VirtualNetwork instead of the real network: thousands of
+simulated hosts with their own latency, packet loss and timeouts, answered
+through the real AsyncNetworkScanner machinery (concurrency limits, probe
+racing, DNS pipeline). Database benchmarks run against a synthetic SQLite
+dataset with up to millions of status_logs rows, and endpoint latency is
+measured through Flask's test client on a copy of that dataset.
+
+Results are written as JSON; pass an earlier result file with --compare to
+report regressions between commits:
+
+    python benchmark.py --size medium --workdir .benchmark
+    python benchmark.py --size medium --workdir .benchmark --compare benchmark-abc1234.json
+"""
+import argparse
+import asyncio
+import ipaddress
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from database import DatabaseManager
+from network_scanner import (
+    AsyncNetworkScanner, DeviceMonitor, HostnameCache, NetworkScanner, ScanProgress, DNS_TIMEOUT
+)
+from scan_jobs import SCAN_INGEST_BATCH
+
+logger = logging.getLogger(__name__)
+
+# Bumped when metrics are renamed or measured differently, so stale baselines are not compared
+BENCHMARK_VERSION = 1
+
+# Dataset and sweep sizes; --devices, --status-logs and --sweep-range override them
+SIZES = {
+    'small': {'devices': 1000, 'status_logs': 200000, 'sweep_range': '10.1.0.0/22'},
+    'medium': {'devices': 5000, 'status_logs': 1000000, 'sweep_range': '10.1.0.0/20'},
+    'large': {'devices': 20000, 'status_logs': 5000000, 'sweep_range': '10.1.0.0/18'},
+}
+
+# Synthetic devices are numbered from here; the sweep range is kept apart from it
+DATASET_NETWORK = '10.0.0.0/16'
+DATASET_DAYS = 30
+DATASET_GROUPS = 4
+
+# Mean outages per device over the dataset, and their mean length in checks
+DATASET_OUTAGES = 6
+DATASET_OUTAGE_CHECKS = 3
+
+# Probe timeout of sweeps, as scan jobs use
+SWEEP_TIMEOUT = 2
+
+STAGES = ('sweep', 'monitor', 'ingest', 'endpoints')
+
+# Relative change in a metric reported as a regression by --compare
+DEFAULT_TOLERANCE = 0.2
+
+
+class VirtualNetwork:
+    """Simulated hosts standing in for a real network.
+
+    Whether an address is up, answers TCP, has a PTR record and how far
+    away it is are fixed per address (derived from `seed`), so a dataset's
+    history matches what later probes see. Each probe then draws its own
+    jitter and loss; `slow_ratio` of the hosts are far enough away that
+    probes often time out.
+    """
+
+    def __init__(self, up_ratio=0.6, tcp_ratio=0.5, named_ratio=0.7, latency_ms=4.0, jitter=0.3,
+                 loss=0.02, slow_ratio=0.02, dns_latency_ms=3.0, seed=1):
+        self.up_ratio = up_ratio
+        self.tcp_ratio = tcp_ratio
+        self.named_ratio = named_ratio
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.loss = loss
+        self.slow_ratio = slow_ratio
+        self.dns_latency_ms = dns_latency_ms
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._hosts = {}
+
+    def host(self, ip_address):
+        """The fixed profile of an address"""
+        profile = self._hosts.get(ip_address)
+        if profile is None:
+            rng = random.Random(f"{self.seed}:{ip_address}")
+            latency = self.latency_ms * rng.lognormvariate(0, 0.75)
+            if rng.random() < self.slow_ratio:
+                latency *= 300
+            profile = self._hosts[ip_address] = {
+                'up': rng.random() < self.up_ratio,
+                'tcp': rng.random() < self.tcp_ratio,
+                'hostname': f"host-{ip_address.replace('.', '-')}.bench.local" if rng.random() < self.named_ratio else None,
+                'latency': latency
+            }
+        return profile
+
+    def response_time(self, ip_address):
+        """Round-trip time (ms) of one ICMP probe, or None if it gets no answer"""
+        profile = self.host(ip_address)
+        if not profile['up'] or self._random.random() < self.loss:
+            return None
+        return profile['latency'] * self._random.lognormvariate(0, self.jitter)
+
+    def connect_time(self, ip_address):
+        """Time (ms) until a TCP connect gets a SYN-ACK or reset, or None if it is dropped"""
+        if not self.host(ip_address)['tcp']:
+            return None
+        return self.response_time(ip_address)
+
+    def lookup_time(self, ip_address):
+        """Time (ms) a reverse-DNS lookup takes, or None if it times out"""
+        if self._random.random() < self.loss:
+            return None
+        return self.dns_latency_ms * self._random.lognormvariate(0, self.jitter)
+
+
+class SimulatedAsyncNetworkScanner(AsyncNetworkScanner):
+    """AsyncNetworkScanner whose ICMP, TCP and DNS answers come from a VirtualNetwork.
+
+    Only the packets are simulated: concurrency limits, probe racing, the
+    resolver pipeline and the hostname cache are the real code. Simulated
+    waits are multiplied by `time_scale`.
+    """
+
+    def __init__(self, scanner, network, time_scale=1.0, **kwargs):
+        super().__init__(scanner, arp=False, **kwargs)
+        self.network = network
+        self.time_scale = time_scale
+
+    async def _answer(self, response_time, timeout):
+        """Wait as a probe would: the RTT once it answers, or None after `timeout`"""
+        if response_time is None or response_time / 1000 > timeout:
+            await asyncio.sleep(timeout * self.time_scale)
+            return None
+        await asyncio.sleep(response_time / 1000 * self.time_scale)
+        return response_time
+
+    async def _open_sweeper(self, timeout):
+        return None
+
+    async def _icmp_alive(self, sweeper, ip_address, timeout):
+        rtt = await self._answer(self.network.response_time(ip_address), timeout)
+        return None if rtt is None else {'probe': 'icmp', 'response_time': rtt}
+
+    async def _tcp_alive(self, ip_address, port, timeout):
+        async with self._limiter('connect'):
+            rtt = await self._answer(self.network.connect_time(ip_address), timeout)
+        return None if rtt is None else {'probe': 'tcp', 'response_time': rtt}
+
+    async def check_tcp_port(self, ip_address, port, timeout=1):
+        async with self._limiter('connect'):
+            return await self._answer(self.network.connect_time(ip_address), timeout) is not None
+
+    async def resolve_hostname(self, ip_address, timeout=DNS_TIMEOUT):
+        cache = self.scanner.hostname_cache
+        hit, hostname = cache.get(ip_address)
+        if hit:
+            return hostname
+
+        async with self._limiter('dns'):
+            answered = await self._answer(self.network.lookup_time(ip_address), timeout)
+        hostname = self.network.host(ip_address)['hostname'] if answered is not None else None
+        cache.set(ip_address, hostname)
+        return hostname
+
+
+def simulated_scanner(network, time_scale=1.0):
+    """A NetworkScanner probing `network`, with a hostname cache of its own"""
+    scanner = NetworkScanner(hostname_cache=HostnameCache())
+    scanner.async_scanner = SimulatedAsyncNetworkScanner(scanner, network, time_scale)
+    return scanner
+
+
+def _timings(seconds):
+    """Summary of repeated timings in ms"""
+    ordered = sorted(seconds)
+    return {
+        'runs': len(ordered),
+        'median_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[max(0, -(-len(ordered) * 95 // 100) - 1)] * 1000
+    }
+
+
+def _dataset_addresses(count):
+    return [str(ip) for ip in itertools.islice(ipaddress.IPv4Network(DATASET_NETWORK).hosts(), count)]
+
+
+def _table_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ('devices', 'status_logs', 'status_intervals', 'status_samples', 'status_rollups')
+        }
+    finally:
+        conn.close()
+
+
+def build_dataset(db_path, network, devices, status_logs, days=DATASET_DAYS, seed=1):
+    """Create a database of `devices` devices with `status_logs` checks spread over `days`.
+
+    Every device is checked at the same times, as DeviceMonitor batches do,
+    and rows are written in time order. Up hosts have a few short outages
+    and down hosts a few short online runs; response times follow the
+    VirtualNetwork profiles. Status intervals, raw samples and rollups are
+    derived from the logs the same way an upgraded database is.
+    """
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    db = DatabaseManager(db_path)
+    try:
+        addresses = _dataset_addresses(devices)
+        profiles = [network.host(ip_address) for ip_address in addresses]
+        device_ids = {}
+        for start in range(0, devices, SCAN_INGEST_BATCH):
+            batch = [
+                {
+                    'ip_address': ip_address,
+                    'hostname': profile['hostname'],
+                    'device_type': 'Unknown',
+                    'status': 'online' if profile['up'] else 'offline',
+                    'response_time': None
+                }
+                for ip_address, profile in zip(addresses[start:start + SCAN_INGEST_BATCH],
+                                               profiles[start:start + SCAN_INGEST_BATCH])
+            ]
+            device_ids.update(db.ingest_scan_results(batch)['device_ids'])
+        ids = np.array([device_ids[ip_address] for ip_address in addresses], dtype=np.int64)
+
+        group_ids = [
+            db.add_device_group(f'Bench {index + 1}', check_interval=60 * (index + 1),
+                                retention_days=None if index % 2 == 0 else days // 2)
+            for index in range(DATASET_GROUPS)
+        ]
+
+        checks = max(1, status_logs // devices)
+        spacing = days * 86400 / checks
+        first_check = time.time() - days * 86400
+
+        # Runs that flip a device away from its usual state, marked as +1/-1 and summed
+        up = np.array([profile['up'] for profile in profiles])
+        runs = rng.poisson(DATASET_OUTAGES, devices)
+        run_device = np.repeat(np.arange(devices), runs)
+        run_start = rng.integers(0, checks, run_device.size)
+        run_end = np.minimum(run_start + rng.geometric(1 / DATASET_OUTAGE_CHECKS, run_device.size), checks)
+        marks = np.zeros((devices, checks + 1), dtype=np.int32)
+        np.add.at(marks, (run_device, run_start), 1)
+        np.add.at(marks, (run_device, run_end), -1)
+        online = up[:, None] ^ (np.cumsum(marks[:, :checks], axis=1) > 0)
+        del marks
+
+        latency = np.array([profile['latency'] for profile in profiles])
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            for table in ('status_logs', 'status_intervals', 'status_samples', 'status_rollups'):
+                cursor.execute(f"DELETE FROM {table}")
+            cursor.execute("""
+                UPDATE devices SET group_id = (
+                    SELECT id FROM device_groups WHERE name = 'Bench ' || (devices.id % ? + 1)
+                )
+            """, (DATASET_GROUPS,))
+            for check in range(checks):
+                rtt = (latency * rng.lognormal(0, network.jitter, devices)).astype(object)
+                rtt[~online[:, check]] = None
+                timestamp = int(first_check + check * spacing)
+                cursor.executemany("""
+                    INSERT INTO status_logs (device_id, status, response_time, timestamp)
+                    VALUES (?, ?, ?, datetime(?, 'unixepoch'))
+                """, zip(
+                    ids.tolist(),
+                    np.where(online[:, check], 'online', 'offline').tolist(),
+                    rtt.tolist(),
+                    itertools.repeat(timestamp)
+                ))
+                if check % 50 == 49:
+                    logger.info(f"Wrote {(check + 1) * devices} of {checks * devices} status logs")
+            conn.commit()
+
+        db.rebuild_status_intervals()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            # Seed samples and rollups from status_logs as the rollup upgrade does
+            db._migrate_status_rollups(cursor)
+            cursor.execute("""
+                UPDATE devices SET
+                    is_active = COALESCE((
+                        SELECT status = 'online' FROM status_intervals
+                        WHERE device_id = devices.id AND ended_at IS NULL
+                    ), 0),
+                    last_seen = COALESCE((
+                        SELECT MAX(last_confirmed) FROM status_intervals
+                        WHERE device_id = devices.id AND status = 'online'
+                    ), last_seen)
+            """)
+            conn.commit()
+            cursor.execute("ANALYZE")
+            conn.commit()
+    finally:
+        db.close()
+
+    return {
+        'devices': devices,
+        'groups': len(group_ids),
+        'checks_per_device': checks,
+        'days': days,
+        'build_seconds': time.perf_counter() - started,
+        'file_bytes': os.path.getsize(db_path),
+        **_table_counts(db_path)
+    }
+
+
+def prepare_dataset(workdir, network, devices, status_logs, days, seed):
+    """Build the dataset in `workdir`, or reuse one built there with the same settings"""
+    db_path = os.path.join(workdir, 'dataset.db')
+    meta_path = os.path.join(workdir, 'dataset.json')
+    settings = {'devices': devices, 'status_logs': status_logs, 'days': days, 'seed': seed,
+                'benchmark_version': BENCHMARK_VERSION}
+    if os.path.exists(db_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('settings') == settings:
+            logger.info(f"Reusing dataset {db_path}")
+            return db_path, meta['dataset']
+
+    for path in (db_path, db_path + '-wal', db_path + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    logger.info(f"Building dataset of {devices} devices and {status_logs} status logs")
+    dataset = build_dataset(db_path, network, devices, status_logs, days, seed)
+    logger.info(f"Dataset built in {dataset['build_seconds']:.1f}s")
+    with open(meta_path, 'w') as f:
+        json.dump({'settings': settings, 'dataset': dataset}, f, indent=2)
+    return db_path, dataset
+
+
+def bench_sweep(network, sweep_range, time_scale):
+    """Stream a ping sweep of `sweep_range` the way scan jobs do"""
+    scanner = simulated_scanner(network, time_scale)
+    progress = ScanProgress(sweep_range, 'ping')
+    started = time.perf_counter()
+    first_device = None
+    found = 0
+    for _ in scanner.iter_scan(sweep_range, progress=progress, timeout=SWEEP_TIMEOUT):
+        found += 1
+        if first_device is None:
+            first_device = time.perf_counter() - started
+    duration = time.perf_counter() - started
+    return {
+        'hosts': progress.hosts_total,
+        'devices_found': found,
+        'duration_seconds': duration,
+        'first_device_seconds': first_device,
+        'hosts_per_second': progress.hosts_total / duration
+    }
+
+
+def bench_monitor(db_path, network, time_scale, cycles):
+    """Run full DeviceMonitor check cycles over every dataset device"""
+    db = DatabaseManager(db_path, status_log_mode='compact')
+    try:
+        monitor = DeviceMonitor(db)
+        monitor.scanner = simulated_scanner(network, time_scale)
+        durations = []
+        for _ in range(cycles):
+            cycle = monitor.check_all_devices()
+            durations.append(cycle['duration'])
+
+        started = time.perf_counter()
+        db.rollup_status_samples()
+        rollup = time.perf_counter() - started
+    finally:
+        db.close()
+    return {
+        'devices': cycle['devices_checked'],
+        'cycle': _timings(durations),
+        'devices_per_second': cycle['devices_checked'] / min(durations),
+        'rollup_seconds': rollup
+    }
+
+
+def bench_ingest(workdir, db_path, network, devices, repeat):
+    """Scan result ingest into an empty database, and status batches into the dataset"""
+    ingest_path = os.path.join(workdir, 'ingest.db')
+    for path in (ingest_path, ingest_path + '-wal', ingest_path + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    found = [
+        {
+            'ip_address': ip_address,
+            'hostname': network.host(ip_address)['hostname'],
+            'device_type': 'Unknown',
+            'status': 'online',
+            'response_time': network.host(ip_address)['latency']
+        }
+        for ip_address in _dataset_addresses(devices)
+    ]
+    results = {}
+    db = DatabaseManager(ingest_path, status_log_mode='compact')
+    try:
+        for name in ('new_devices_per_second', 'known_devices_per_second'):
+            started = time.perf_counter()
+            for start in range(0, len(found), SCAN_INGEST_BATCH):
+                db.ingest_scan_results(found[start:start + SCAN_INGEST_BATCH])
+            results[name] = len(found) / (time.perf_counter() - started)
+    finally:
+        db.close()
+
+    db = DatabaseManager(db_path, status_log_mode='full')
+    try:
+        device_ids = [device['id'] for device in db.get_all_devices()]
+        rows = 0
+        started = time.perf_counter()
+        for _ in range(repeat):
+            db.log_device_statuses(
+                (device_id, 'online' if random.random() > 0.1 else 'offline', random.uniform(1, 20))
+                for device_id in device_ids
+            )
+            rows += len(device_ids)
+        results['status_rows_per_second'] = rows / (time.perf_counter() - started)
+    finally:
+        db.close()
+    return results
+
+
+def bench_endpoints(workdir, repeat):
+    """Time the dashboard's pages and API endpoints through Flask's test client.
+
+    The app opens network_devices.db in the working directory, so this runs
+    from `workdir`, where the dataset copy lives.
+    """
+    os.chdir(workdir)
+    try:
+        import app as dashboard
+    except ImportError as e:
+        logger.error(f"Skipping endpoint benchmarks, the app cannot be imported: {e}")
+        return {'error': str(e)}
+
+    client = dashboard.app.test_client()
+    device = dashboard.db.get_devices_page(sort='ip', limit=1)['devices'][0]
+    endpoints = {
+        'dashboard': '/',
+        'devices_page': '/devices',
+        'device_detail': f"/device/{device['ip_address']}",
+        'api_stats': '/api/stats',
+        'api_devices_status': '/api/devices/status',
+        'api_devices_status_search': '/api/devices/status?search=bench',
+        'api_devices_status_last_seen': '/api/devices/status?sort=last_seen&order=desc',
+        'api_response_times_24h': f"/api/device/{device['id']}/response_times?hours=24",
+        'api_response_times_30d': f"/api/device/{device['id']}/response_times?hours=720",
+        'api_sla_device': f"/api/reports/sla?device_id={device['id']}&days=30",
+        'api_sla_network': '/api/reports/sla?days=7',
+        'api_monitor_status': '/api/monitor/status'
+    }
+    results = {}
+    for name, url in endpoints.items():
+        durations = []
+        status = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url)
+            durations.append(time.perf_counter() - started)
+            status = response.status_code
+        results[name] = {'url': url, 'status': status, **_timings(durations)}
+        logger.info(f"{url}: median {results[name]['median_ms']:.1f} ms")
+    return results
+
+
+def _git_revision():
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=repo, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo, capture_output=True, text=True,
+            check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit, 'dirty': dirty}
+
+
+def _metrics(results, prefix=''):
+    """Flatten results into {'stage.metric': value} for the metrics that have a direction"""
+    metrics = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(_metrics(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key.endswith(
+                ('_per_second', '_ms', '_seconds')):
+            metrics[name] = value
+    return metrics
+
+
+def compare_results(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Metrics that got more than `tolerance` worse (or better) than in `baseline`.
+
+    Rates (*_per_second) should go up and times (*_ms, *_seconds) down;
+    each entry's `change` is how much worse the metric got, as a fraction.
+    Query plans that lost their index are reported as regressions too.
+    """
+    before = _metrics(baseline['results'])
+    after = _metrics(current['results'])
+    regressions = []
+    improvements = []
+    for name in sorted(before.keys() & after.keys()):
+        if not before[name]:
+            continue
+        change = (after[name] - before[name]) / before[name]
+        if name.endswith('_per_second'):
+            change = -change
+        entry = {'metric': name, 'baseline': before[name], 'current': after[name], 'change': change}
+        if change > tolerance:
+            regressions.append(entry)
+        elif change < -tolerance:
+            improvements.append(entry)
+
+    for name, problems in current.get('query_plans', {}).items():
+        if problems and not baseline.get('query_plans', {}).get(name):
+            regressions.append({'metric': f"query_plans.{name}", 'baseline': [], 'current': problems})
+    return {'regressions': regressions, 'improvements': improvements}
+
+
+def run(args):
+    size = SIZES[args.size]
+    devices = args.devices or size['devices']
+    status_logs = args.status_logs or size['status_logs']
+    sweep_range = args.sweep_range or size['sweep_range']
+    stages = args.stages.split(',') if args.stages else list(STAGES)
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    network = VirtualNetwork(seed=args.seed)
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='network-checker-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        dataset_path, dataset = prepare_dataset(workdir, network, devices, status_logs, args.days, args.seed)
+        # Stages write to a copy, so a reused dataset is the same for every run
+        db_path = os.path.join(workdir, 'network_devices.db')
+        for path in (db_path, db_path + '-wal', db_path + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.copyfile(dataset_path, db_path)
+
+        results = {}
+        if 'sweep' in stages:
+            logger.info(f"Sweeping {sweep_range}")
+            results['sweep'] = bench_sweep(network, sweep_range, args.time_scale)
+        if 'monitor' in stages:
+            logger.info(f"Running {args.cycles} monitor cycles over {devices} devices")
+            results['monitor'] = bench_monitor(db_path, network, args.time_scale, args.cycles)
+        if 'ingest' in stages:
+            logger.info("Measuring ingest")
+            results['ingest'] = bench_ingest(workdir, db_path, network, devices, args.repeat)
+
+        db = DatabaseManager(db_path)
+        try:
+            query_plans = {name: plan['problems'] for name, plan in db.check_query_plans().items()}
+        finally:
+            db.close()
+
+        if 'endpoints' in stages:
+            logger.info("Measuring endpoint latency")
+            results['endpoints'] = bench_endpoints(workdir, args.repeat)
+    finally:
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'benchmark_version': BENCHMARK_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'git': _git_revision(),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'settings': {
+            'size': args.size,
+            'devices': devices,
+            'status_logs': status_logs,
+            'days': args.days,
+            'sweep_range': sweep_range,
+            'stages': stages,
+            'cycles': args.cycles,
+            'repeat': args.repeat,
+            'time_scale': args.time_scale,
+            'seed': args.seed
+        },
+        'dataset': dataset,
+        'results': results,
+        'query_plans': query_plans
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the scanner, monitor and database hot paths')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small', help='dataset and sweep size preset')
+    parser.add_argument('--devices', type=int, help='devices in the dataset')
+    parser.add_argument('--status-logs', type=int, help='status_logs rows in the dataset')
+    parser.add_argument('--days', type=int, default=DATASET_DAYS, help='days of history in the dataset')
+    parser.add_argument('--sweep-range', help='network range to sweep')
+    parser.add_argument('--stages', help=f"comma-separated stages to run (default: {','.join(STAGES)})")
+    parser.add_argument('--cycles', type=int, default=3, help='monitor cycles to run')
+    parser.add_argument('--repeat', type=int, default=20, help='requests per endpoint and status batches to ingest')
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help='multiplier for simulated latencies and timeouts')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help='keep the dataset here and reuse it on later runs')
+    parser.add_argument('--output', help='result file (default: benchmark-<commit>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='relative change reported as a regression')
+    parser.add_argument('--verbose', action='store_true', help='keep the scanner and database INFO logs')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    if not args.verbose:
+        # Per-device log lines would dominate the timings
+        for name in ('network_scanner', 'database', 'app', 'network_stats', 'werkzeug'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('benchmark_version') != BENCHMARK_VERSION:
+            logger.warning(f"{args.compare} is from benchmark version {baseline.get('benchmark_version')}, "
+                           f"not {BENCHMARK_VERSION}; metrics may not be comparable")
+    output = os.path.abspath(args.output) if args.output else None
+
+    report = run(args)
+    if output is None:
+        output = os.path.abspath(f"benchmark-{report['git']['commit'] or 'local'}.json")
+    if baseline is not None:
+        if baseline.get('settings') != report['settings']:
+            logger.warning(f"{args.compare} was run with different settings; metrics may not be comparable")
+        report['comparison'] = compare_results(baseline, report, args.tolerance)
+
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Results written to {output}")
+
+    for name, value in sorted(_metrics(report['results']).items()):
+        print(f"{name:60} {value:12.2f}")
+    for name, problems in report['query_plans'].items():
+        if problems:
+            print(f"query plan {name} is not index-backed: {'; '.join(problems)}")
+
+    if baseline is not None:
+        comparison = report['comparison']
+        for label, entries in (('Regressions', comparison['regressions']), ('Improvements', comparison['improvements'])):
+            if entries:
+                print(f"\n{label} against {args.compare}:")
+                for entry in entries:
+                    if 'change' in entry:
+                        print(f"  {entry['metric']:58} {entry['baseline']:12.2f} -> {entry['current']:<12.2f} "
+                              f"{entry['change']:+.0%}")
+                    else:
+                        print(f"  {entry['metric']:58} {'; '.join(entry['current'])}")
+        return 1 if comparison['regressions'] else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
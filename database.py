@@ -1,22 +1,334 @@
 import sqlite3
+import base64
 import datetime
+import ipaddress
+import json
+import logging
+import threading
+import time
 from contextlib import contextmanager
 
+import numpy as np
+
+import analytics
+
+logger = logging.getLogger(__name__)
+
 DATABASE = 'network_devices.db'
 
+# Persistent connections shared by request, scan, monitor and broadcaster threads
+DEFAULT_POOL_SIZE = 8
+
+# Prepared statements kept per connection, keyed by SQL text
+STATEMENT_CACHE_SIZE = 256
+
+# Applied to every pooled connection; WAL lets readers run alongside a writer.
+# auto_vacuum only takes effect on a new database (migration 7 converts old ones)
+DEFAULT_PRAGMAS = {
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # negative values are KiB
+    'mmap_size': 64 * 1024 * 1024,
+    'busy_timeout': 5000,  # ms
+}
+
+# Rows per page on the device listings, and the most a caller may ask for
+DEVICES_PER_PAGE = 100
+MAX_DEVICES_PER_PAGE = 1000
+
+# Keyset sort orders for device listings; each is backed by an index on devices
+# and ties are broken by id, so every row has a unique position
+DEVICE_SORT_KEYS = {
+    'ip': 'd.ip_int',
+    'name': "COALESCE(d.custom_name, d.hostname, '')",
+    'last_seen': "COALESCE(d.last_seen, '')",
+}
+
+# Full-text searches are listed best match first by default; the cursor
+# carries the bm25 rank, which the devices_fts subquery computes per match
+RELEVANCE_SORT = 'relevance'
+RELEVANCE_SORT_KEY = 'f.rank'
+
+# ip_int for addresses that are not IPv4; sorts them after every IPv4 address
+NON_IPV4_SORT_KEY = 1 << 32
+
+# Columns of the devices_fts search index with their bm25 ranking weights;
+# group_name comes from device_groups, the rest from devices
+SEARCH_INDEX_COLUMNS = [
+    ('ip_address', 10.0),
+    ('hostname', 8.0),
+    ('custom_name', 8.0),
+    ('mac_address', 4.0),
+    ('vendor', 2.0),
+    ('group_name', 2.0),
+    ('notes', 1.0),
+]
+
+# Values per IN (...) lookup, well under SQLite's bound-parameter limit
+IN_CLAUSE_CHUNK_SIZE = 500
+
+# 'full' logs every check to status_logs; 'compact' logs only status changes
+# and relies on status_intervals for the run-length history in between
+STATUS_LOG_MODES = ('full', 'compact')
+
+# Raw check samples kept for charts and rollups; must cover a full day so the
+# daily rollup can still be computed from them
+RAW_SAMPLE_RETENTION = 2 * 86400
+
+# Rollup resolutions in seconds, with how long (seconds) each is kept; None keeps it forever
+ROLLUP_RESOLUTIONS = [
+    (60, 7 * 86400),
+    (3600, 90 * 86400),
+    (86400, None),
+]
+
+# Shortest interval between two checks of a device (the monitor's minimum),
+# used to estimate how many raw samples a time span holds
+RAW_SAMPLE_SPACING = 30
+
+# Most points a response-time query returns before a coarser resolution is used
+RESPONSE_TIME_MAX_POINTS = 1500
+
+# Raw samples as (device_id, ts in ms, online, rtt); the rollup SQL reads its
+# input from one of these
+SAMPLE_SOURCE = "SELECT device_id, ts, online, rtt FROM status_samples"
+STATUS_LOG_SAMPLE_SOURCE = """
+    SELECT device_id, CAST(strftime('%s', timestamp) AS INTEGER) * 1000 AS ts,
+           status = 'online' AS online, response_time AS rtt
+    FROM status_logs
+"""
+
+# Status history kept for groups without their own retention_days
+DEFAULT_RETENTION_DAYS = 30
+
+# Shortest check interval a group may set; the monitor never rechecks a
+# device sooner than this anyway
+MIN_CHECK_INTERVAL = 30
+
+# Retention deletes at most this many rows per transaction and pauses between
+# batches so the monitor and web requests get the database in between
+RETENTION_BATCH_SIZE = 2000
+RETENTION_BATCH_PAUSE = 0.05
+
+# Devices per retention delete; with their newest log ids this stays under
+# SQLite's bound-parameter limit
+RETENTION_DEVICE_CHUNK = 400
+
+# Free pages handed back to the filesystem per incremental_vacuum step
+VACUUM_PAGES_PER_STEP = 256
+
+def _utc_now():
+    """Current time in the format SQLite's CURRENT_TIMESTAMP uses"""
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def _to_epoch(timestamp):
+    """Unix time of a UTC timestamp in the format _utc_now produces"""
+    try:
+        parsed = datetime.datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid timestamp: {timestamp!r}")
+    return int(parsed.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+def _from_epoch(seconds):
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def _rollup_sql(source):
+    """SELECT aggregating samples from `source` into buckets of :resolution seconds.
+
+    Covers samples with :start <= ts < :end (ms). p95 is the nearest-rank
+    95th percentile of the bucket's response times.
+    """
+    return f"""
+        WITH samples AS ({source}), ranked AS (
+            SELECT device_id, ts / 1000 / :resolution * :resolution AS bucket, online, rtt,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY device_id, ts / 1000 / :resolution ORDER BY rtt IS NULL, rtt
+                   ) AS rtt_rank,
+                   COUNT(rtt) OVER (PARTITION BY device_id, ts / 1000 / :resolution) AS rtt_total
+            FROM samples
+            WHERE ts >= :start AND ts < :end
+        )
+        SELECT device_id, :resolution AS resolution, bucket,
+               COUNT(*) AS checks, SUM(online) AS online,
+               COUNT(rtt) AS rtt_count, TOTAL(rtt) AS rtt_sum, MIN(rtt) AS rtt_min, MAX(rtt) AS rtt_max,
+               MIN(CASE WHEN rtt IS NOT NULL AND rtt_rank * 100 >= rtt_total * 95 THEN rtt END) AS rtt_p95
+        FROM ranked
+        GROUP BY device_id, bucket
+    """
+
+def _ip_to_int(ip_address):
+    """Numeric sort key for an IP address string"""
+    try:
+        return int(ipaddress.IPv4Address(ip_address))
+    except ValueError:
+        return NON_IPV4_SORT_KEY
+
+def _ip_range(query):
+    """(low, high) ip_int bounds for a CIDR block or an 'a.b.c.d - e.f.g.h' range, else None"""
+    try:
+        if '/' in query:
+            network = ipaddress.IPv4Network(query.strip(), strict=False)
+            return int(network.network_address), int(network.broadcast_address)
+        if '-' in query:
+            start, end = (int(ipaddress.IPv4Address(part.strip())) for part in query.split('-', 1))
+            return min(start, end), max(start, end)
+    except ValueError:
+        pass
+    return None
+
+def _fts_query(query):
+    """FTS5 MATCH expression requiring every whitespace-separated term as a prefix"""
+    terms = [term for term in query.split() if any(char.isalnum() for char in term)]
+    return ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+def _encode_cursor(sort_key, device_id):
+    """Opaque page cursor for the row at (sort_key, device_id)"""
+    payload = json.dumps([sort_key, device_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_key, device_id = json.loads(payload)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid page cursor: {cursor!r}")
+    if not isinstance(device_id, int) or not isinstance(sort_key, (int, float, str)):
+        raise ValueError(f"Invalid page cursor: {cursor!r}")
+    return sort_key, device_id
+
+def _group_setting(value, name, minimum):
+    """Validate an optional whole-number group setting; None leaves it unset"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"{name} must be a whole number")
+    if value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return value
+
+def _chunks(items, size=IN_CLAUSE_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class ConnectionPool:
+    """Thread-aware pool of persistent SQLite connections.
+
+    Connections are opened lazily up to `max_size` and reused, so their
+    prepared statement caches survive between calls. A thread that already
+    holds a connection gets the same one back when it asks again.
+    """
+
+    def __init__(self, db_path, max_size=DEFAULT_POOL_SIZE, pragmas=None):
+        self.db_path = db_path
+        # Every connection to :memory: would be a separate database
+        self.max_size = 1 if db_path == ':memory:' else max_size
+        self.pragmas = pragmas or {}
+        self._idle = []
+        self._created = 0
+        self._condition = threading.Condition()
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _acquire(self):
+        with self._condition:
+            while not self._idle and self._created >= self.max_size:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._condition:
+                self._created -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, conn):
+        try:
+            # Discard whatever a failed caller left uncommitted
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._condition:
+                self._created -= 1
+                self._condition.notify()
+            return
+
+        with self._condition:
+            self._idle.append(conn)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    def close(self):
+        """Close idle connections; checked-out ones close when returned"""
+        with self._condition:
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+
 class DatabaseManager:
-    def __init__(self, db_path=DATABASE):
+    def __init__(self, db_path=DATABASE, pool_size=DEFAULT_POOL_SIZE, pragmas=None, status_log_mode='full',
+                 event_bus=None):
+        if status_log_mode not in STATUS_LOG_MODES:
+            raise ValueError(f"status_log_mode must be one of {STATUS_LOG_MODES}")
         self.db_path = db_path
+        self.status_log_mode = status_log_mode
+        # Optional events.EventBus; device writes publish their changes to it once committed
+        self.event_bus = event_bus
+        self.full_text_search = False
+        self.pool = ConnectionPool(db_path, pool_size, {**DEFAULT_PRAGMAS, **(pragmas or {})})
         self.init_database()
 
     @contextmanager
     def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        try:
+        with self.pool.connection() as conn:
             yield conn
-        finally:
-            conn.close()
+
+    def close(self):
+        """Close the pooled database connections"""
+        self.pool.close()
+
+    def _publish(self, event_type, data):
+        if self.event_bus is not None:
+            self.event_bus.publish(event_type, data)
+
+    def _publish_transitions(self, transitions):
+        for device_id, status, response_time, previous_status in transitions:
+            self._publish('device_status', {
+                'device_id': device_id,
+                'status': status,
+                'previous_status': previous_status,
+                'response_time': response_time
+            })
 
     def init_database(self):
         """Initialize the database with required tables"""
@@ -77,8 +389,42 @@ class DatabaseManager:
                 )
             ''')
             
+            # Run-length status history: one row per run of identical statuses
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS status_intervals (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    device_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    since TIMESTAMP NOT NULL,
+                    last_confirmed TIMESTAMP NOT NULL,
+                    ended_at TIMESTAMP,
+                    checks INTEGER NOT NULL DEFAULT 1,
+                    rtt_count INTEGER NOT NULL DEFAULT 0,
+                    rtt_sum REAL NOT NULL DEFAULT 0,
+                    rtt_min REAL,
+                    rtt_max REAL,
+                    rtt_last REAL,
+                    FOREIGN KEY (device_id) REFERENCES devices (id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_status_intervals_open
+                ON status_intervals (device_id) WHERE ended_at IS NULL
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_status_intervals_device_since
+                ON status_intervals (device_id, since)
+            ''')
+            
             conn.commit()
             
+            self._apply_migrations(cursor)
+            self.full_text_search = self._ensure_search_index(cursor)
+            
+            for name, result in self.check_query_plans().items():
+                if result['problems']:
+                    logger.warning(f"Query '{name}' is not index-backed: {'; '.join(result['problems'])}")
+            
             # Insert default device group if not exists
             cursor.execute("SELECT COUNT(*) FROM device_groups WHERE name = 'Default'")
             if cursor.fetchone()[0] == 0:
@@ -88,6 +434,373 @@ class DatabaseManager:
                 """)
                 conn.commit()
 
+    def _schema_migrations(self):
+        """Schema changes applied in order on top of the base tables.
+
+        PRAGMA user_version records the last one applied, so each runs once
+        per database. Append new steps; never renumber existing ones.
+        """
+        return [
+            (1, self._migrate_group_check_interval),
+            (2, self._migrate_hot_query_indexes),
+            (3, self._migrate_backfill_status_intervals),
+            (4, self._migrate_device_sort_keys),
+            (5, self._migrate_status_rollups),
+            (6, self._migrate_covering_sample_index),
+            (7, self._migrate_retention),
+        ]
+
+    def _apply_migrations(self, cursor):
+        cursor.execute("PRAGMA user_version")
+        current_version = cursor.fetchone()[0]
+        for version, migrate in self._schema_migrations():
+            if version <= current_version:
+                continue
+            logger.info(f"Applying schema migration {version}: {migrate.__doc__}")
+            migrate(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+            cursor.connection.commit()
+
+    def _add_column_if_missing(self, cursor, table, column, definition):
+        """Add a column to an existing table created by an older version"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row['name'] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _migrate_group_check_interval(self, cursor):
+        """Per-group polling interval for DeviceMonitor (NULL = monitor default)"""
+        self._add_column_if_missing(cursor, 'device_groups', 'check_interval', 'INTEGER')
+
+    def _migrate_hot_query_indexes(self, cursor):
+        """Indexes behind status history, recent changes, log cleanup and group joins"""
+        # Covers get_device_status_history and cleanup_old_logs' MAX(id) per device
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_status_logs_device_time
+            ON status_logs (device_id, timestamp, status, response_time)
+        ''')
+        # Covers the recent-changes feed and the cleanup cutoff
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_status_logs_time
+            ON status_logs (timestamp, device_id, status)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_devices_group
+            ON devices (group_id)
+        ''')
+        cursor.execute("ANALYZE")
+
+    def _migrate_backfill_status_intervals(self, cursor):
+        """Derive status_intervals for databases that predate them"""
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM status_intervals)")
+        if not cursor.fetchone()[0]:
+            self.rebuild_status_intervals()
+
+    def _migrate_device_sort_keys(self, cursor):
+        """Numeric ip_int column and the indexes behind keyset-paginated device listings"""
+        self._add_column_if_missing(cursor, 'devices', 'ip_int', 'INTEGER')
+        cursor.execute("SELECT id, ip_address FROM devices")
+        cursor.executemany(
+            "UPDATE devices SET ip_int = ? WHERE id = ?",
+            [(_ip_to_int(row['ip_address']), row['id']) for row in cursor.fetchall()]
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_ip ON devices (ip_int)")
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_devices_name
+            ON devices ({DEVICE_SORT_KEYS['name'].replace('d.', '')})
+        """)
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_devices_last_seen
+            ON devices ({DEVICE_SORT_KEYS['last_seen'].replace('d.', '')})
+        """)
+        # (group_id, ip_int) serves the group filter and the group joins, so
+        # the single-column group index from migration 2 is redundant
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_group_ip ON devices (group_id, ip_int)")
+        cursor.execute("DROP INDEX IF EXISTS idx_devices_group")
+        cursor.execute("ANALYZE")
+
+    def _migrate_status_rollups(self, cursor):
+        """Raw check samples and min/avg/max/p95/uptime rollups of them per minute, hour and day"""
+        # Clustered on (device_id, ts) so one device's samples are contiguous
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS status_samples (
+                device_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                online INTEGER NOT NULL,
+                rtt REAL,
+                PRIMARY KEY (device_id, ts)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_status_samples_ts ON status_samples (ts)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS status_rollups (
+                device_id INTEGER NOT NULL,
+                resolution INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                checks INTEGER NOT NULL,
+                online INTEGER NOT NULL,
+                rtt_count INTEGER NOT NULL,
+                rtt_sum REAL NOT NULL,
+                rtt_min REAL,
+                rtt_max REAL,
+                rtt_p95 REAL,
+                PRIMARY KEY (device_id, resolution, bucket)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_status_rollups_bucket ON status_rollups (resolution, bucket)")
+        # How far (ms) each resolution has been rolled up
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS status_rollup_state (
+                resolution INTEGER PRIMARY KEY,
+                rolled_up_to INTEGER NOT NULL
+            )
+        ''')
+        
+        # Seed from existing history: rollups within each resolution's
+        # retention, and the recent raw window
+        now_ms = int(time.time() * 1000)
+        for resolution, retention in ROLLUP_RESOLUTIONS:
+            width = resolution * 1000
+            end = now_ms // width * width
+            start = 0 if retention is None else (now_ms - retention * 1000) // width * width
+            cursor.execute(
+                f"INSERT OR REPLACE INTO status_rollups {_rollup_sql(STATUS_LOG_SAMPLE_SOURCE)}",
+                {'resolution': resolution, 'start': start, 'end': end}
+            )
+            cursor.execute("INSERT OR REPLACE INTO status_rollup_state VALUES (?, ?)", (resolution, end))
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO status_samples
+            SELECT * FROM ({STATUS_LOG_SAMPLE_SOURCE}) WHERE ts >= ?
+        """, (now_ms - RAW_SAMPLE_RETENTION * 1000,))
+
+    def _migrate_covering_sample_index(self, cursor):
+        """Make the status_samples time index cover response times for bulk analytics reads"""
+        # Secondary indexes on WITHOUT ROWID tables carry the primary key, so
+        # (ts, rtt) holds everything SLA reports read; it serves ts ranges too
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_status_samples_ts_rtt ON status_samples (ts, rtt)")
+        cursor.execute("DROP INDEX IF EXISTS idx_status_samples_ts")
+        cursor.execute("ANALYZE")
+
+    def _migrate_retention(self, cursor):
+        """Per-group status history retention and incremental auto-vacuum"""
+        self._add_column_if_missing(cursor, 'device_groups', 'retention_days', 'INTEGER')
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            # The mode only takes effect after a full VACUUM, which locks the
+            # database for the whole rewrite, so that is left to vacuum()
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            logger.warning(
+                "Database was created without incremental auto-vacuum; space freed by retention "
+                "is reused but not returned to the filesystem until DatabaseManager.vacuum() "
+                "is run once during maintenance"
+            )
+
+    def _ensure_search_index(self, cursor):
+        """Create the devices_fts index and the triggers that keep it in sync.
+
+        Not a numbered migration because FTS5 is an optional SQLite module:
+        the index is built the first time the database is opened by a build
+        that has it. Returns False (searches fall back to LIKE) without FTS5.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'devices_fts'")
+        if cursor.fetchone():
+            return True
+        
+        columns = [name for name, _ in SEARCH_INDEX_COLUMNS]
+        column_list = ', '.join(columns)
+        values = lambda row: ', '.join(
+            f"(SELECT name FROM device_groups WHERE id = {row}.group_id)" if name == 'group_name' else f"{row}.{name}"
+            for name in columns
+        )
+        device_columns = [name for name in columns if name != 'group_name'] + ['group_id']
+        try:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE devices_fts USING fts5(
+                    {column_list}, tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 unavailable, device search will use LIKE: {e}")
+            return False
+        
+        cursor.execute(f"""
+            CREATE TRIGGER devices_fts_insert AFTER INSERT ON devices BEGIN
+                INSERT INTO devices_fts (rowid, {column_list}) VALUES (new.id, {values('new')});
+            END
+        """)
+        # Scans and monitor checks rewrite devices constantly; only reindex
+        # when a searchable value actually changed
+        cursor.execute(f"""
+            CREATE TRIGGER devices_fts_update AFTER UPDATE OF {', '.join(device_columns)} ON devices
+            WHEN {' OR '.join(f'old.{name} IS NOT new.{name}' for name in device_columns)}
+            BEGIN
+                DELETE FROM devices_fts WHERE rowid = old.id;
+                INSERT INTO devices_fts (rowid, {column_list}) VALUES (new.id, {values('new')});
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER devices_fts_delete AFTER DELETE ON devices BEGIN
+                DELETE FROM devices_fts WHERE rowid = old.id;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER device_groups_fts_rename AFTER UPDATE OF name ON device_groups
+            WHEN old.name IS NOT new.name
+            BEGIN
+                UPDATE devices_fts SET group_name = new.name
+                WHERE rowid IN (SELECT id FROM devices WHERE group_id = new.id);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER device_groups_fts_delete AFTER DELETE ON device_groups BEGIN
+                UPDATE devices_fts SET group_name = NULL
+                WHERE rowid IN (SELECT id FROM devices WHERE group_id = old.id);
+            END
+        """)
+        cursor.execute(f"""
+            INSERT INTO devices_fts (rowid, {column_list})
+            SELECT d.id, {values('d')} FROM devices d
+        """)
+        cursor.connection.commit()
+        logger.info("Built device search index")
+        return True
+
+    def _search_condition(self, search):
+        """SQL condition on devices d (and its params) matching a search string.
+
+        CIDR blocks and address ranges select on ip_int; anything else is a
+        prefix search on the FTS index, or LIKE without FTS5.
+        """
+        bounds = _ip_range(search)
+        if bounds:
+            return "d.ip_int BETWEEN ? AND ?", list(bounds)
+        match = _fts_query(search)
+        if self.full_text_search and match:
+            return "d.id IN (SELECT rowid FROM devices_fts WHERE devices_fts MATCH ?)", [match]
+        like_columns = [name for name, _ in SEARCH_INDEX_COLUMNS if name != 'group_name']
+        return (
+            f"({' OR '.join(f'd.{name} LIKE ?' for name in like_columns)})",
+            [f"%{search}%"] * len(like_columns)
+        )
+
+    def _hot_queries(self):
+        """Queries that must stay index-backed, as (name, sql, params)"""
+        return [
+            ('device_status_history', """
+                SELECT * FROM status_logs WHERE device_id = ? ORDER BY timestamp DESC LIMIT ?
+            """, (1, 50)),
+            ('recent_status_changes', """
+                SELECT d.ip_address, d.hostname, d.custom_name, sl.status, sl.timestamp
+                FROM status_logs sl
+                JOIN devices d ON sl.device_id = d.id
+                ORDER BY sl.timestamp DESC
+                LIMIT 10
+            """, ()),
+            ('devices_by_group', """
+                SELECT g.name, COUNT(d.id) as count, g.color
+                FROM device_groups g
+                LEFT JOIN devices d ON g.id = d.group_id
+                GROUP BY g.id, g.name, g.color
+            """, ()),
+            ('retention_status_logs', """
+                DELETE FROM status_logs WHERE id IN (
+                    SELECT id FROM status_logs
+                    WHERE device_id IN (?, ?) AND timestamp < ? AND id NOT IN (?, ?)
+                    LIMIT ?
+                )
+            """, (1, 2, '2000-01-01', 0, 0, RETENTION_BATCH_SIZE)),
+            ('retention_status_intervals', """
+                DELETE FROM status_intervals WHERE id IN (
+                    SELECT id FROM status_intervals
+                    WHERE device_id IN (?, ?) AND since < ? AND ended_at < ?
+                    LIMIT ?
+                )
+            """, (1, 2, '2000-01-01', '2000-01-01', RETENTION_BATCH_SIZE)),
+            ('device_timeline', """
+                SELECT * FROM status_intervals WHERE device_id = ? ORDER BY since DESC, id DESC
+            """, (1,)),
+            ('response_times_raw', """
+                SELECT ts, online, rtt FROM status_samples
+                WHERE device_id = ? AND ts >= ? AND ts < ?
+                ORDER BY ts
+            """, (1, 0, 1)),
+            ('response_times_rollup', """
+                SELECT * FROM status_rollups
+                WHERE device_id = ? AND resolution = ? AND bucket >= ? AND bucket < ?
+                ORDER BY bucket
+            """, (1, 60, 0, 1)),
+            ('rollup_retention', """
+                DELETE FROM status_rollups WHERE resolution = ? AND bucket < ?
+            """, (60, 0)),
+            ('raw_sample_retention', """
+                DELETE FROM status_samples WHERE ts < ?
+            """, (0,)),
+            ('sla_samples', """
+                SELECT device_id, rtt FROM status_samples
+                WHERE ts >= ? AND ts < ? AND rtt IS NOT NULL
+            """, (0, 1)),
+            ('devices_page', """
+                SELECT d.* FROM devices d
+                WHERE (d.ip_int, d.id) > (?, ?)
+                ORDER BY d.ip_int, d.id
+                LIMIT ?
+            """, (0, 0, DEVICES_PER_PAGE + 1)),
+            ('devices_page_by_name', f"""
+                SELECT d.* FROM devices d
+                WHERE {DEVICE_SORT_KEYS['name']} >= ? AND ({DEVICE_SORT_KEYS['name']}, d.id) > (?, ?)
+                ORDER BY {DEVICE_SORT_KEYS['name']}, d.id
+                LIMIT ?
+            """, ('', '', 0, DEVICES_PER_PAGE + 1)),
+            ('devices_page_by_last_seen', f"""
+                SELECT d.* FROM devices d
+                WHERE {DEVICE_SORT_KEYS['last_seen']} <= ? AND ({DEVICE_SORT_KEYS['last_seen']}, d.id) < (?, ?)
+                ORDER BY {DEVICE_SORT_KEYS['last_seen']} DESC, d.id DESC
+                LIMIT ?
+            """, ('9999', '9999', 0, DEVICES_PER_PAGE + 1)),
+            ('devices_in_range', """
+                SELECT d.* FROM devices d
+                WHERE d.ip_int BETWEEN ? AND ?
+                ORDER BY d.ip_int, d.id
+                LIMIT ?
+            """, (0, 255, DEVICES_PER_PAGE + 1)),
+            ('devices_page_by_group', """
+                SELECT d.* FROM devices d
+                WHERE d.group_id = ? AND (d.ip_int, d.id) > (?, ?)
+                ORDER BY d.ip_int, d.id
+                LIMIT ?
+            """, (1, 0, 0, DEVICES_PER_PAGE + 1)),
+        ]
+
+    def check_query_plans(self):
+        """EXPLAIN the hot queries and report any that scan a large table without an index.
+
+        Returns {name: {'plan': [...], 'problems': [...]}}; an empty problems
+        list means the query is index-backed. Small lookup tables
+        (device_groups) may be scanned. Device pages seeking from a cursor
+        must not even scan an index in order, or deep pages cost O(offset).
+        """
+        large_tables = {'status_logs', 'status_intervals', 'status_samples', 'status_rollups', 'devices', 'sl', 'd'}
+        seek_queries = {'devices_page', 'devices_page_by_name', 'devices_page_by_last_seen', 'devices_page_by_group'}
+        report = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Cached EXPLAIN statements are not re-planned after schema changes,
+            # so key their text on the schema version
+            cursor.execute("PRAGMA schema_version")
+            schema_version = cursor.fetchone()[0]
+            for name, sql, params in self._hot_queries():
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql} /* schema {schema_version} */", params)
+                plan = [row['detail'] for row in cursor.fetchall()]
+                problems = []
+                for detail in plan:
+                    words = detail.replace('SCAN TABLE ', 'SCAN ').split()
+                    if words[:1] == ['SCAN'] and words[1] in large_tables and (
+                            'INDEX' not in words or name in seek_queries):
+                        problems.append(detail)
+                    elif 'AUTOMATIC' in words or ('TEMP B-TREE' in detail and 'ORDER BY' in detail):
+                        problems.append(detail)
+                report[name] = {'plan': plan, 'problems': problems}
+        return report
+
     def add_device(self, ip_address, hostname=None, mac_address=None, vendor=None, device_type=None):
         """Add a new device or update existing one"""
         with self.get_connection() as conn:
@@ -110,6 +823,13 @@ class DatabaseManager:
                     WHERE ip_address = ?
                 """, (hostname, mac_address, vendor, device_type, ip_address))
                 device_id = existing[0]
+                event = ('device_updated', {
+                    'device_id': device_id,
+                    **{name: value for name, value in (
+                        ('hostname', hostname), ('mac_address', mac_address),
+                        ('vendor', vendor), ('device_type', device_type)
+                    ) if value is not None}
+                })
             else:
                 # Get default group ID
                 cursor.execute("SELECT id FROM device_groups WHERE name = 'Default'")
@@ -117,35 +837,205 @@ class DatabaseManager:
                 
                 # Insert new device
                 cursor.execute("""
-                    INSERT INTO devices (ip_address, hostname, mac_address, vendor, device_type, group_id)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (ip_address, hostname, mac_address, vendor, device_type, default_group))
+                    INSERT INTO devices (ip_address, ip_int, hostname, mac_address, vendor, device_type, group_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (ip_address, _ip_to_int(ip_address), hostname, mac_address, vendor, device_type, default_group))
                 device_id = cursor.lastrowid
+                event = ('device_added', {
+                    'device_id': device_id,
+                    'ip_address': ip_address,
+                    'hostname': hostname,
+                    'group_id': default_group
+                })
             
             conn.commit()
+            self._publish(*event)
             return device_id
 
     def log_device_status(self, device_id, status, response_time=None):
         """Log device status check result"""
+        self.log_device_statuses([(device_id, status, response_time)])
+
+    def log_device_statuses(self, results):
+        """Log a batch of (device_id, status, response_time) check results in one transaction"""
+        results = list(results)
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO status_logs (device_id, status, response_time)
-                VALUES (?, ?, ?)
-            """, (device_id, status, response_time))
+            # Take the write lock before _record_statuses reads the open intervals
+            cursor.execute("BEGIN IMMEDIATE")
+            transitions = self._record_statuses(cursor, results)
             
             # Update device's last_seen if online
-            if status == 'online':
-                cursor.execute("""
-                    UPDATE devices SET last_seen = CURRENT_TIMESTAMP, is_active = 1
-                    WHERE id = ?
-                """, (device_id,))
-            else:
+            cursor.executemany("""
+                UPDATE devices SET last_seen = CURRENT_TIMESTAMP, is_active = 1
+                WHERE id = ?
+            """, [(device_id,) for device_id, status, _ in results if status == 'online'])
+            cursor.executemany("""
+                UPDATE devices SET is_active = 0 WHERE id = ?
+            """, [(device_id,) for device_id, status, _ in results if status != 'online'])
+            
+            conn.commit()
+        self._publish_transitions(transitions)
+
+    def _record_statuses(self, cursor, results):
+        """Fold check results into status_intervals and append them to status_logs.
+
+        Each device has one open interval per run of identical statuses; a
+        repeated status only bumps its last_confirmed time and RTT aggregates.
+        In compact mode only results that change a device's status (or are its
+        first check) are written to status_logs. Returns those transitions as
+        (device_id, status, response_time, previous_status).
+
+        Callers begin the transaction with BEGIN IMMEDIATE, so no other
+        writer can open or close an interval between reading the open
+        intervals and writing them back.
+        """
+        now = _utc_now()
+        now_ms = int(time.time() * 1000)
+        
+        open_intervals = {}
+        for chunk in _chunks({device_id for device_id, _, _ in results}):
+            cursor.execute(f"""
+                SELECT id, device_id, status FROM status_intervals
+                WHERE ended_at IS NULL AND device_id IN ({','.join('?' * len(chunk))})
+            """, chunk)
+            open_intervals.update((row['device_id'], (row['id'], row['status'])) for row in cursor.fetchall())
+        
+        confirmations = []
+        transitions = []
+        for device_id, status, response_time in results:
+            current = open_intervals.get(device_id)
+            if current is not None and current[1] == status:
+                confirmations.append({'id': current[0], 'now': now, 'rtt': response_time})
+                continue
+            
+            if current is not None:
+                cursor.execute("UPDATE status_intervals SET ended_at = ? WHERE id = ?", (now, current[0]))
+            cursor.execute("""
+                INSERT INTO status_intervals
+                    (device_id, status, since, last_confirmed, rtt_count, rtt_sum, rtt_min, rtt_max, rtt_last)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                device_id, status, now, now,
+                0 if response_time is None else 1, response_time or 0,
+                response_time, response_time, response_time
+            ))
+            open_intervals[device_id] = (cursor.lastrowid, status)
+            transitions.append((device_id, status, response_time, current and current[1]))
+        
+        cursor.executemany("""
+            UPDATE status_intervals
+            SET last_confirmed = :now,
+                checks = checks + 1,
+                rtt_count = rtt_count + (:rtt IS NOT NULL),
+                rtt_sum = rtt_sum + COALESCE(:rtt, 0),
+                rtt_min = CASE WHEN :rtt IS NULL THEN rtt_min ELSE MIN(COALESCE(rtt_min, :rtt), :rtt) END,
+                rtt_max = CASE WHEN :rtt IS NULL THEN rtt_max ELSE MAX(COALESCE(rtt_max, :rtt), :rtt) END,
+                rtt_last = COALESCE(:rtt, rtt_last)
+            WHERE id = :id
+        """, confirmations)
+        
+        cursor.executemany("""
+            INSERT INTO status_logs (device_id, status, response_time)
+            VALUES (?, ?, ?)
+        """, results if self.status_log_mode == 'full' else [transition[:3] for transition in transitions])
+        
+        # Every check is kept as a raw sample, whatever the log mode, for rollups
+        cursor.executemany("""
+            INSERT OR REPLACE INTO status_samples (device_id, ts, online, rtt)
+            VALUES (?, ?, ?, ?)
+        """, [(device_id, now_ms, status == 'online', response_time) for device_id, status, response_time in results])
+        
+        return transitions
+
+    def ingest_scan_results(self, devices, scan_meta=None):
+        """Save a scan's devices, their status and the scan record in one transaction.
+
+        Devices are upserted on ip_address and their status rows bulk-inserted,
+        so ingesting thousands of hosts costs a handful of statements and a
+        single commit. Returns the scan_history id (or None) and a mapping of
+        ip_address to device id.
+        """
+        devices = list(devices)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Take the write lock before _record_statuses reads the open intervals
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            cursor.execute("SELECT id FROM device_groups WHERE name = 'Default'")
+            default_group = cursor.fetchone()[0]
+            
+            known_ips = set()
+            for chunk in _chunks({device['ip_address'] for device in devices}):
+                cursor.execute(
+                    f"SELECT ip_address FROM devices WHERE ip_address IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                known_ips.update(row['ip_address'] for row in cursor.fetchall())
+            
+            cursor.executemany("""
+                INSERT INTO devices (ip_address, ip_int, hostname, mac_address, vendor, device_type, group_id, is_active)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(ip_address) DO UPDATE SET
+                    hostname = COALESCE(excluded.hostname, hostname),
+                    mac_address = COALESCE(excluded.mac_address, mac_address),
+                    vendor = COALESCE(excluded.vendor, vendor),
+                    device_type = COALESCE(excluded.device_type, device_type),
+                    last_seen = CASE WHEN excluded.is_active THEN CURRENT_TIMESTAMP ELSE last_seen END,
+                    is_active = excluded.is_active
+            """, [
+                (
+                    device['ip_address'],
+                    _ip_to_int(device['ip_address']),
+                    device.get('hostname'),
+                    device.get('mac_address'),
+                    device.get('vendor'),
+                    device.get('device_type'),
+                    default_group,
+                    1 if device['status'] == 'online' else 0
+                )
+                for device in devices
+            ])
+            
+            # Look up ids in chunks to stay under SQLite's bound-parameter limit
+            device_ids = {}
+            for chunk in _chunks({device['ip_address'] for device in devices}):
+                cursor.execute(
+                    f"SELECT id, ip_address FROM devices WHERE ip_address IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                device_ids.update((row['ip_address'], row['id']) for row in cursor.fetchall())
+            
+            transitions = self._record_statuses(cursor, [
+                (device_ids[device['ip_address']], device['status'], device.get('response_time'))
+                for device in devices
+            ])
+            
+            scan_id = None
+            if scan_meta is not None:
                 cursor.execute("""
-                    UPDATE devices SET is_active = 0 WHERE id = ?
-                """, (device_id,))
+                    INSERT INTO scan_history (scan_type, network_range, devices_found, duration)
+                    VALUES (?, ?, ?, ?)
+                """, (
+                    scan_meta.get('scan_type'),
+                    scan_meta.get('network_range'),
+                    scan_meta.get('devices_found', len(devices)),
+                    scan_meta.get('duration')
+                ))
+                scan_id = cursor.lastrowid
             
             conn.commit()
+        for device in devices:
+            if device['ip_address'] not in known_ips:
+                known_ips.add(device['ip_address'])
+                self._publish('device_added', {
+                    'device_id': device_ids[device['ip_address']],
+                    'ip_address': device['ip_address'],
+                    'hostname': device.get('hostname'),
+                    'group_id': default_group
+                })
+        self._publish_transitions(transitions)
+        return {'scan_id': scan_id, 'device_ids': device_ids}
 
     def get_all_devices(self):
         """Get all devices with their group information"""
@@ -156,24 +1046,124 @@ class DatabaseManager:
                 SELECT d.*, g.name as group_name, g.color as group_color
                 FROM devices d
                 LEFT JOIN device_groups g ON d.group_id = g.id
-                ORDER BY d.ip_address
+                ORDER BY d.ip_int, d.id
             """)
             return [dict(row) for row in cursor.fetchall()]
 
-    def search_devices(self, query):
-        """Search devices by IP, hostname, or custom name"""
+    def get_devices_page(self, group_id=None, search=None, sort=None, descending=False,
+                         after=None, before=None, limit=DEVICES_PER_PAGE, with_status=False):
+        """Get one page of devices in keyset order, filtered by group and/or search text.
+
+        `sort` is one of DEVICE_SORT_KEYS or 'relevance'. Full-text searches
+        default to relevance (bm25 rank, best first); everything else, and
+        relevance without a full-text search, is in IP order.
+        `after`/`before` take the next_cursor/prev_cursor of a previous page;
+        seeking from a cursor is an index lookup, so every page costs the same
+        however deep it is. With `with_status` each row also carries its
+        current status, response_time and status_since.
+        """
+        if sort not in DEVICE_SORT_KEYS and sort not in (None, RELEVANCE_SORT):
+            raise ValueError(f"Unknown device sort: {sort}")
+        if after and before:
+            raise ValueError("Pass either after or before, not both")
+        match = _fts_query(search) if search and self.full_text_search and not _ip_range(search) else ''
+        if sort in (None, RELEVANCE_SORT):
+            sort = RELEVANCE_SORT if match else 'ip'
+        ranked = sort == RELEVANCE_SORT
+        sort_key = RELEVANCE_SORT_KEY if ranked else DEVICE_SORT_KEYS[sort]
+        limit = max(1, min(limit, MAX_DEVICES_PER_PAGE))
+        
+        conditions = []
+        params = []
+        if group_id is not None:
+            conditions.append("d.group_id = ?")
+            params.append(group_id)
+        count_conditions = conditions[:]
+        count_params = params[:]
+        if search:
+            condition, search_params = self._search_condition(search)
+            count_conditions.append(condition)
+            count_params.extend(search_params)
+            if not ranked:
+                conditions.append(condition)
+                params.extend(search_params)
+        filters = f"WHERE {' AND '.join(count_conditions)}" if count_conditions else ""
+        
+        source = "devices d"
+        if ranked:
+            # Ranked pages read the matches with their rank from the index;
+            # the search itself is the join
+            weights = ', '.join(str(weight) for _, weight in SEARCH_INDEX_COLUMNS)
+            source = f"""(
+                    SELECT rowid, bm25(devices_fts, {weights}) AS rank FROM devices_fts WHERE devices_fts MATCH ?
+                ) f
+                JOIN devices d ON d.id = f.rowid"""
+            params.insert(0, match)
+        
+        # Walking backwards from `before` reads the index in reverse and the
+        # rows are flipped back into display order afterwards
+        backwards = before is not None
+        ascending = descending == backwards
+        cursor_value = before or after
+        seek_params = list(params)
+        if cursor_value:
+            # SQLite only seeks an expression index on a plain comparison with
+            # the expression, so the row-value test gets a leading bound
+            conditions.append(
+                f"{sort_key} {'>=' if ascending else '<='} ? AND ({sort_key}, d.id) {'>' if ascending else '<'} (?, ?)"
+            )
+            sort_value, device_id = _decode_cursor(cursor_value)
+            seek_params.extend([sort_value, sort_value, device_id])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = 'ASC' if ascending else 'DESC'
+        
+        if with_status:
+            columns = """d.id, d.ip_address, d.hostname, d.custom_name, d.is_active, d.last_seen,
+                       si.status, si.rtt_last AS response_time, si.since AS status_since"""
+            # The open status interval is the maintained current status of each device
+            join = "LEFT JOIN status_intervals si ON si.device_id = d.id AND si.ended_at IS NULL"
+        else:
+            columns = "d.*, g.name as group_name, g.color as group_color"
+            join = "LEFT JOIN device_groups g ON d.group_id = g.id"
+        
         with self.get_connection() as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            search_pattern = f"%{query}%"
-            cursor.execute("""
-                SELECT d.*, g.name as group_name, g.color as group_color
-                FROM devices d
-                LEFT JOIN device_groups g ON d.group_id = g.id
-                WHERE d.ip_address LIKE ? OR d.hostname LIKE ? OR d.custom_name LIKE ?
-                ORDER BY d.ip_address
-            """, (search_pattern, search_pattern, search_pattern))
-            return [dict(row) for row in cursor.fetchall()]
+            cursor.execute(f"SELECT COUNT(*) FROM devices d {filters}", count_params)
+            total = cursor.fetchone()[0]
+            cursor.execute(f"""
+                SELECT {columns}, {sort_key} AS sort_key
+                FROM {source}
+                {join}
+                {where}
+                ORDER BY {sort_key} {direction}, d.id {direction}
+                LIMIT ?
+            """, seek_params + [limit + 1])
+            rows = [dict(row) for row in cursor.fetchall()]
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            rows.reverse()
+        positions = [(row.pop('sort_key'), row['id']) for row in rows]
+        
+        next_cursor = prev_cursor = None
+        if positions:
+            # A page reached backwards always has rows after it; one reached
+            # forwards from a cursor always has rows before it
+            if has_more or backwards:
+                next_cursor = _encode_cursor(*positions[-1])
+            if (has_more and backwards) or after is not None:
+                prev_cursor = _encode_cursor(*positions[0])
+        
+        return {
+            'devices': rows,
+            'total': total,
+            'limit': limit,
+            'sort': sort,
+            'descending': descending,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor
+        }
 
     def get_device_by_ip(self, ip_address):
         """Get device by IP address"""
@@ -201,6 +1191,12 @@ class DatabaseManager:
                 WHERE id = ?
             """, (custom_name, notes, group_id, device_id))
             conn.commit()
+        self._publish('device_updated', {
+            'device_id': device_id,
+            **{name: value for name, value in (
+                ('custom_name', custom_name), ('notes', notes), ('group_id', group_id)
+            ) if value is not None}
+        })
 
     def get_device_groups(self):
         """Get all device groups"""
@@ -210,16 +1206,39 @@ class DatabaseManager:
             cursor.execute("SELECT * FROM device_groups ORDER BY name")
             return [dict(row) for row in cursor.fetchall()]
 
-    def add_device_group(self, name, description=None, color='#007bff'):
-        """Add a new device group"""
+    def get_device_groups_with_counts(self):
+        """Get all device groups with the number of devices in each"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO device_groups (name, description, color)
-                VALUES (?, ?, ?)
-            """, (name, description, color))
+                SELECT g.*, COUNT(d.id) as device_count
+                FROM device_groups g
+                LEFT JOIN devices d ON d.group_id = g.id
+                GROUP BY g.id
+                ORDER BY g.name
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def add_device_group(self, name, description=None, color='#007bff', check_interval=None,
+                         retention_days=None):
+        """Add a new device group.
+
+        `check_interval` (seconds, at least MIN_CHECK_INTERVAL) and
+        `retention_days` (at least 1) are optional; an invalid value raises
+        ValueError.
+        """
+        check_interval = _group_setting(check_interval, 'check_interval', MIN_CHECK_INTERVAL)
+        retention_days = _group_setting(retention_days, 'retention_days', 1)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO device_groups (name, description, color, check_interval, retention_days)
+                VALUES (?, ?, ?, ?, ?)
+            """, (name, description, color, check_interval, retention_days))
             conn.commit()
-            return cursor.lastrowid
+            group_id = cursor.lastrowid
+        self._publish('group_added', {'group_id': group_id, 'name': name, 'color': color})
+        return group_id
 
     def get_device_status_history(self, device_id, limit=50):
         """Get status history for a device"""
@@ -234,6 +1253,320 @@ class DatabaseManager:
             """, (device_id, limit))
             return [dict(row) for row in cursor.fetchall()]
 
+    def get_device_timeline(self, device_id, since=None, until=None):
+        """Get a device's status timeline as intervals, newest first.
+
+        Each interval covers a run of identical statuses, with its start,
+        end (the last confirmation while it is still ongoing), number of
+        checks and response-time aggregates.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT * FROM status_intervals
+                WHERE device_id = ?
+                  AND (? IS NULL OR COALESCE(ended_at, last_confirmed) >= ?)
+                  AND (? IS NULL OR since <= ?)
+                ORDER BY since DESC, id DESC
+            """, (device_id, since, since, until, until))
+            return [
+                {
+                    'status': row['status'],
+                    'since': row['since'],
+                    'until': row['ended_at'] or row['last_confirmed'],
+                    'last_confirmed': row['last_confirmed'],
+                    'ongoing': row['ended_at'] is None,
+                    'checks': row['checks'],
+                    'avg_response_time': row['rtt_sum'] / row['rtt_count'] if row['rtt_count'] else None,
+                    'min_response_time': row['rtt_min'],
+                    'max_response_time': row['rtt_max'],
+                    'last_response_time': row['rtt_last']
+                }
+                for row in cursor.fetchall()
+            ]
+
+    def rollup_status_samples(self):
+        """Aggregate completed buckets of raw samples into each rollup resolution and apply retention.
+
+        Each resolution is rolled up from the raw samples (so p95s are exact)
+        up to the start of its current bucket, then rows past its retention
+        are dropped. Raw samples are dropped once every resolution has rolled
+        them up and they are older than RAW_SAMPLE_RETENTION. Returns the
+        number of rollup rows written per resolution.
+        """
+        now_ms = int(time.time() * 1000)
+        written = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT resolution, rolled_up_to FROM status_rollup_state")
+            rolled_up_to = {row['resolution']: row['rolled_up_to'] for row in cursor.fetchall()}
+            cursor.execute("SELECT MIN(ts) FROM status_samples")
+            oldest = cursor.fetchone()[0]
+            
+            for resolution, retention in ROLLUP_RESOLUTIONS:
+                width = resolution * 1000
+                end = now_ms // width * width
+                start = rolled_up_to.get(resolution, end if oldest is None else oldest // width * width)
+                written[resolution] = 0
+                if end > start:
+                    cursor.execute(
+                        f"INSERT OR REPLACE INTO status_rollups {_rollup_sql(SAMPLE_SOURCE)}",
+                        {'resolution': resolution, 'start': start, 'end': end}
+                    )
+                    written[resolution] = cursor.rowcount
+                    cursor.execute("INSERT OR REPLACE INTO status_rollup_state VALUES (?, ?)", (resolution, end))
+                    rolled_up_to[resolution] = end
+                if retention is not None:
+                    cursor.execute(
+                        "DELETE FROM status_rollups WHERE resolution = ? AND bucket < ?",
+                        (resolution, now_ms // 1000 - retention)
+                    )
+            
+            cursor.execute(
+                "DELETE FROM status_samples WHERE ts < ?",
+                (min([now_ms - RAW_SAMPLE_RETENTION * 1000] + list(rolled_up_to.values())),)
+            )
+            conn.commit()
+        return written
+
+    def _pick_resolution(self, since, until, max_points):
+        """Finest resolution (None for raw samples) that is retained back to `since` and fits max_points"""
+        now = time.time()
+        span = until - since
+        if since >= now - RAW_SAMPLE_RETENTION and span / RAW_SAMPLE_SPACING <= max_points:
+            return None
+        for resolution, retention in ROLLUP_RESOLUTIONS:
+            if (retention is None or since >= now - retention) and span / resolution <= max_points:
+                return resolution
+        return ROLLUP_RESOLUTIONS[-1][0]
+
+    def get_response_times(self, device_id, since=None, until=None, max_points=RESPONSE_TIME_MAX_POINTS):
+        """Get a device's response times and uptime between two UTC timestamps, for charting.
+
+        The resolution is picked from the span: raw samples for short spans,
+        then minute, hour or day rollups, so the result stays within
+        `max_points`. Buckets not yet rolled up are aggregated on the fly from
+        the raw samples. Defaults to the last 24 hours.
+        """
+        # Up to and including the current second
+        until = _to_epoch(until) if until else int(time.time()) + 1
+        since = _to_epoch(since) if since else until - 86400
+        if since >= until:
+            raise ValueError("since must be before until")
+        resolution = self._pick_resolution(since, until, max_points)
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if resolution is None:
+                cursor.execute("""
+                    SELECT ts, online, rtt FROM status_samples
+                    WHERE device_id = ? AND ts >= ? AND ts < ?
+                    ORDER BY ts
+                """, (device_id, since * 1000, until * 1000))
+                points = [
+                    {
+                        'timestamp': _from_epoch(row['ts'] // 1000),
+                        'checks': 1,
+                        'uptime': float(row['online']),
+                        'avg_response_time': row['rtt'],
+                        'min_response_time': row['rtt'],
+                        'max_response_time': row['rtt'],
+                        'p95_response_time': row['rtt']
+                    }
+                    for row in cursor.fetchall()
+                ]
+            else:
+                cursor.execute("SELECT rolled_up_to FROM status_rollup_state WHERE resolution = ?", (resolution,))
+                row = cursor.fetchone()
+                rolled_up_to = row[0] // 1000 if row else since
+                first_bucket = since // resolution * resolution
+                cursor.execute("""
+                    SELECT * FROM status_rollups
+                    WHERE device_id = ? AND resolution = ? AND bucket >= ? AND bucket < ?
+                    ORDER BY bucket
+                """, (device_id, resolution, first_bucket, min(rolled_up_to, until)))
+                rows = cursor.fetchall()
+                if rolled_up_to < until:
+                    cursor.execute(f"{_rollup_sql(SAMPLE_SOURCE + ' WHERE device_id = :device_id')} ORDER BY bucket", {
+                        'device_id': device_id,
+                        'resolution': resolution,
+                        'start': max(rolled_up_to, first_bucket) * 1000,
+                        'end': until * 1000
+                    })
+                    rows += cursor.fetchall()
+                points = [
+                    {
+                        'timestamp': _from_epoch(row['bucket']),
+                        'checks': row['checks'],
+                        'uptime': row['online'] / row['checks'],
+                        'avg_response_time': row['rtt_sum'] / row['rtt_count'] if row['rtt_count'] else None,
+                        'min_response_time': row['rtt_min'],
+                        'max_response_time': row['rtt_max'],
+                        'p95_response_time': row['rtt_p95']
+                    }
+                    for row in rows
+                ]
+        
+        return {
+            'device_id': device_id,
+            'resolution': 'raw' if resolution is None else resolution,
+            'since': _from_epoch(since),
+            'until': _from_epoch(until),
+            'points': points
+        }
+
+    def get_sla_report(self, device_id=None, group_id=None, since=None, until=None):
+        """Uptime, outages, MTTR/MTBF and latency percentiles for a device, a group or every device.
+
+        since/until are UTC timestamps (default: the last 30 days). Status
+        intervals and response times are loaded in bulk into NumPy arrays
+        and aggregated by the analytics module. Latency comes from raw
+        samples while they are retained, else from the finest rollup kept
+        back to `since`.
+        """
+        until = _to_epoch(until) if until else int(time.time()) + 1
+        since = _to_epoch(since) if since else until - 30 * 86400
+        if since >= until:
+            raise ValueError("since must be before until")
+        
+        conditions, params = [], []
+        if device_id is not None:
+            conditions.append("id = ?")
+            params.append(device_id)
+        if group_id is not None:
+            conditions.append("group_id = ?")
+            params.append(group_id)
+        device_filter = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        scope = f"device_id IN (SELECT id FROM devices {device_filter})"
+        resolution = self._pick_resolution(since, until, float('inf'))
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # One read transaction, so devices, intervals and samples come
+            # from the same snapshot even while the monitor writes
+            cursor.execute("BEGIN")
+            cursor.execute(f"""
+                SELECT id, ip_address, COALESCE(custom_name, hostname) AS name, group_id
+                FROM devices {device_filter}
+                ORDER BY ip_int, id
+            """, params)
+            devices = [dict(row) for row in cursor.fetchall()]
+            
+            # Plain tuples convert to arrays much faster than Rows
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(f"""
+                SELECT device_id,
+                       CAST(strftime('%s', since) AS INTEGER),
+                       CAST(strftime('%s', COALESCE(ended_at, last_confirmed)) AS INTEGER),
+                       status = 'online'
+                FROM status_intervals
+                WHERE {scope} AND COALESCE(ended_at, last_confirmed) >= ? AND since <= ?
+            """, params + [_from_epoch(since), _from_epoch(until)])
+            interval_rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 4)
+            
+            if resolution is None:
+                cursor.execute(f"""
+                    SELECT device_id, rtt FROM status_samples
+                    WHERE {scope} AND ts >= ? AND ts < ? AND rtt IS NOT NULL
+                """, params + [since * 1000, until * 1000])
+                sample_rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 2)
+                samples = {'device_id': sample_rows[:, 0], 'response_time': sample_rows[:, 1]}
+            else:
+                cursor.execute(f"""
+                    SELECT device_id, rtt_sum / rtt_count, rtt_count, rtt_min, rtt_max FROM status_rollups
+                    WHERE {scope} AND resolution = ? AND bucket >= ? AND bucket < ? AND rtt_count > 0
+                """, params + [resolution, since // resolution * resolution, until])
+                sample_rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 5)
+                samples = {
+                    'device_id': sample_rows[:, 0],
+                    'response_time': sample_rows[:, 1],
+                    'count': sample_rows[:, 2],
+                    'min': sample_rows[:, 3],
+                    'max': sample_rows[:, 4]
+                }
+            conn.commit()
+        
+        report = analytics.sla_report(
+            devices,
+            {
+                'device_id': interval_rows[:, 0],
+                'start': interval_rows[:, 1],
+                'end': interval_rows[:, 2],
+                'online': interval_rows[:, 3].astype(bool)
+            },
+            samples, since, until
+        )
+        report.update({
+            'since': _from_epoch(since),
+            'until': _from_epoch(until),
+            'latency_resolution': 'raw' if resolution is None else resolution
+        })
+        return report
+
+    def rebuild_status_intervals(self, device_id=None, force=False):
+        """Recompute status_intervals from status_logs for one or all devices.
+
+        Consecutive rows with the same status collapse into one interval that
+        ends where the next one starts. Returns the number of intervals written.
+
+        In compact mode status_logs holds only status changes, and the check
+        counts and RTT aggregates of repeated checks exist only in the
+        intervals. Rebuilding would reset them to those of the single logged
+        check, so existing intervals are only replaced with `force`, which
+        logs a warning.
+        """
+        device_filter = "WHERE device_id = :device_id" if device_id is not None else ""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if self.status_log_mode == 'compact':
+                cursor.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM status_intervals {device_filter})", {'device_id': device_id}
+                )
+                if cursor.fetchone()[0]:
+                    if not force:
+                        raise ValueError(
+                            "Rebuilding status intervals in compact mode loses their check counts "
+                            "and RTT aggregates; pass force=True to rebuild anyway"
+                        )
+                    logger.warning(
+                        "Rebuilding status intervals from compact status_logs; check counts and RTT "
+                        "aggregates of repeated checks are lost"
+                    )
+            cursor.execute(f"DELETE FROM status_intervals {device_filter}", {'device_id': device_id})
+            cursor.execute(f"""
+                INSERT INTO status_intervals
+                    (device_id, status, since, last_confirmed, ended_at, checks,
+                     rtt_count, rtt_sum, rtt_min, rtt_max, rtt_last)
+                WITH changes AS (
+                    SELECT id, device_id, status, response_time, timestamp,
+                           CASE WHEN status IS LAG(status) OVER w THEN 0 ELSE 1 END AS is_change
+                    FROM status_logs
+                    {device_filter}
+                    WINDOW w AS (PARTITION BY device_id ORDER BY timestamp, id)
+                ), runs AS (
+                    SELECT *, SUM(is_change) OVER (PARTITION BY device_id ORDER BY timestamp, id) AS run
+                    FROM changes
+                ), intervals AS (
+                    SELECT device_id, status,
+                           MIN(timestamp) AS since, MAX(timestamp) AS last_confirmed,
+                           COUNT(*) AS checks, COUNT(response_time) AS rtt_count,
+                           TOTAL(response_time) AS rtt_sum,
+                           MIN(response_time) AS rtt_min, MAX(response_time) AS rtt_max,
+                           MAX(id) AS last_id
+                    FROM runs
+                    GROUP BY device_id, run
+                )
+                SELECT i.device_id, i.status, i.since, i.last_confirmed,
+                       LEAD(i.since) OVER (PARTITION BY i.device_id ORDER BY i.since, i.last_id),
+                       i.checks, i.rtt_count, i.rtt_sum, i.rtt_min, i.rtt_max, sl.response_time
+                FROM intervals i
+                JOIN status_logs sl ON sl.id = i.last_id
+            """, {'device_id': device_id})
+            written = cursor.rowcount
+            conn.commit()
+            return written
+
     def get_network_statistics(self):
         """Get network statistics"""
         with self.get_connection() as conn:
@@ -260,44 +1593,152 @@ class DatabaseManager:
                 for row in cursor.fetchall()
             ]
             
-            # Recent status changes
-            cursor.execute("""
-                SELECT d.ip_address, d.hostname, d.custom_name, sl.status, sl.timestamp
-                FROM status_logs sl
-                JOIN devices d ON sl.device_id = d.id
-                ORDER BY sl.timestamp DESC
-                LIMIT 10
-            """)
-            recent_changes = [
-                {
-                    'ip_address': row[0],
-                    'hostname': row[1],
-                    'custom_name': row[2],
-                    'status': row[3],
-                    'timestamp': row[4]
-                }
-                for row in cursor.fetchall()
-            ]
-            
             return {
                 'total_devices': total_devices,
                 'active_devices': active_devices,
                 'offline_devices': total_devices - active_devices,
                 'devices_by_group': devices_by_group,
-                'recent_changes': recent_changes
+                'recent_changes': self.get_recent_status_changes()
             }
 
-    def cleanup_old_logs(self, days=30):
-        """Clean up old status logs"""
+    def get_recent_status_changes(self, limit=10):
+        """Get the most recent status log entries with their device names"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days)
             cursor.execute("""
-                DELETE FROM status_logs 
-                WHERE timestamp < ? AND id NOT IN (
-                    SELECT MAX(id) FROM status_logs GROUP BY device_id
-                )
-            """, (cutoff_date,))
-            deleted = cursor.rowcount
+                SELECT d.ip_address, d.hostname, d.custom_name, sl.status, sl.timestamp
+                FROM status_logs sl
+                JOIN devices d ON sl.device_id = d.id
+                ORDER BY sl.timestamp DESC
+                LIMIT ?
+            """, (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_device_states(self):
+        """Get the fields network statistics are derived from, for every device"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, ip_address, hostname, custom_name, group_id, is_active FROM devices")
+            return [dict(row) for row in cursor.fetchall()]
+
+    def cleanup_old_logs(self, days=DEFAULT_RETENTION_DAYS):
+        """Clean up old status logs; returns the number of status_logs rows deleted"""
+        return self.apply_retention(default_days=days)['status_logs']
+
+    def apply_retention(self, default_days=DEFAULT_RETENTION_DAYS, stop_event=None):
+        """Delete status history older than each device's group retention, then reclaim the space.
+
+        Groups keep `retention_days` of status_logs and closed
+        status_intervals, or `default_days` when they do not set it; each
+        device's newest status_logs row is always kept. Rows are deleted in
+        short transactions of RETENTION_BATCH_SIZE with a pause in between,
+        and freed pages are returned with incremental vacuum steps. Setting
+        `stop_event` ends the run after the current batch.
+        """
+        started_at = time.time()
+        deleted = {'status_logs': 0, 'status_intervals': 0}
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, retention_days FROM device_groups")
+            group_days = {}
+            for row in cursor.fetchall():
+                try:
+                    group_days[row['id']] = _group_setting(row['retention_days'], 'retention_days', 1)
+                except ValueError as e:
+                    # Stored before settings were validated
+                    logger.warning(f"Ignoring retention_days of group {row['id']} ({e}), keeping {default_days} days")
+            cursor.execute("SELECT id, group_id FROM devices")
+            devices_by_days = {}
+            for row in cursor.fetchall():
+                days = group_days.get(row['group_id']) or default_days
+                devices_by_days.setdefault(days, []).append(row['id'])
+        
+        def delete_in_batches(sql, params):
+            total = 0
+            while not (stop_event and stop_event.is_set()):
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(sql, params + [RETENTION_BATCH_SIZE])
+                    conn.commit()
+                total += cursor.rowcount
+                if cursor.rowcount < RETENTION_BATCH_SIZE:
+                    break
+                time.sleep(RETENTION_BATCH_PAUSE)
+            return total
+        
+        for days, device_ids in devices_by_days.items():
+            cutoff = (
+                datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+            ).strftime('%Y-%m-%d %H:%M:%S')
+            for chunk in _chunks(device_ids, RETENTION_DEVICE_CHUNK):
+                placeholders = ','.join('?' * len(chunk))
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(f"""
+                        SELECT MAX(id) FROM status_logs WHERE device_id IN ({placeholders}) GROUP BY device_id
+                    """, chunk)
+                    newest = [row[0] for row in cursor.fetchall()] or [0]
+                
+                deleted['status_logs'] += delete_in_batches(f"""
+                    DELETE FROM status_logs WHERE id IN (
+                        SELECT id FROM status_logs
+                        WHERE device_id IN ({placeholders}) AND timestamp < ?
+                          AND id NOT IN ({','.join('?' * len(newest))})
+                        LIMIT ?
+                    )
+                """, chunk + [cutoff] + newest)
+                deleted['status_intervals'] += delete_in_batches(f"""
+                    DELETE FROM status_intervals WHERE id IN (
+                        SELECT id FROM status_intervals
+                        WHERE device_id IN ({placeholders}) AND since < ? AND ended_at < ?
+                        LIMIT ?
+                    )
+                """, chunk + [cutoff, cutoff])
+        
+        vacuumed_pages = self.incremental_vacuum(stop_event)
+        
+        duration = time.time() - started_at
+        logger.info(
+            f"Retention removed {deleted['status_logs']} status logs and {deleted['status_intervals']} "
+            f"intervals, freed {vacuumed_pages} pages in {duration:.1f}s"
+        )
+        return {**deleted, 'vacuumed_pages': vacuumed_pages, 'duration': duration}
+
+    def vacuum(self):
+        """Rewrite the database file with VACUUM, switching it to incremental auto-vacuum.
+
+        Needed once on databases created before incremental auto-vacuum.
+        VACUUM locks the database until it finishes, so run this during
+        maintenance, not while the dashboard is busy. Returns True if the file
+        is now in incremental mode.
+        """
+        with self.get_connection() as conn:
             conn.commit()
-            return deleted
\ No newline at end of file
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+            cursor.execute("PRAGMA auto_vacuum")
+            return cursor.fetchone()[0] == 2
+
+    def incremental_vacuum(self, stop_event=None):
+        """Return free pages to the filesystem a step at a time; returns the number released"""
+        released = 0
+        while not (stop_event and stop_event.is_set()):
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("PRAGMA freelist_count")
+                free_pages = cursor.fetchone()[0]
+                if not free_pages:
+                    break
+                conn.commit()
+                # execute() would step the pragma once, freeing a single page
+                cursor.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP});")
+                cursor.execute("PRAGMA freelist_count")
+                step = free_pages - cursor.fetchone()[0]
+            released += step
+            if step <= 0:
+                # Not in incremental auto-vacuum mode
+                break
+            time.sleep(RETENTION_BATCH_PAUSE)
+        return released
@@ -0,0 +1,78 @@
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Events kept for clients that reconnect; older gaps get a full snapshot
+EVENT_HISTORY_SIZE = 10000
+
+class EventBus:
+    """In-process publish/subscribe for device state changes.
+
+    Every event gets the next sequence number and is kept in a ring buffer,
+    so a client that knows the last sequence it saw can be sent just the
+    events it missed. The epoch changes on every process start, which tells
+    clients their sequence numbers belong to a previous run.
+    """
+
+    def __init__(self, history_size=EVENT_HISTORY_SIZE):
+        self.epoch = int(time.time() * 1000)
+        self._sequence = 0
+        self._history = deque(maxlen=history_size)
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Call `callback(event)` for every published event.
+
+        Callbacks run on the publishing thread, in sequence order, while the
+        bus is locked; they should hand the event off (e.g. to a queue)
+        rather than do slow work.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, event_type, data):
+        """Record an event and deliver it to subscribers; returns the event"""
+        with self._lock:
+            self._sequence += 1
+            event = {
+                'seq': self._sequence,
+                'type': event_type,
+                'data': data,
+                'timestamp': time.time()
+            }
+            self._history.append(event)
+            for callback in self._subscribers:
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error(f"Event subscriber failed on {event_type}: {e}")
+            return event
+
+    def current_sequence(self):
+        with self._lock:
+            return self._sequence
+
+    def events_since(self, sequence, epoch=None):
+        """Events after `sequence`, or None if they are no longer all buffered.
+
+        None means the caller must start over from a snapshot: the sequence is
+        from another epoch, ahead of this bus, or older than the ring buffer.
+        """
+        with self._lock:
+            if (epoch is not None and epoch != self.epoch) or sequence > self._sequence:
+                return None
+            if sequence == self._sequence:
+                return []
+            if not self._history or self._history[0]['seq'] > sequence + 1:
+                return None
+            return [event for event in self._history if event['seq'] > sequence]
@@ -1,27 +1,998 @@
-import nmap
 import socket
 import subprocess
 import threading
 import time
 from pythonping import ping
+import asyncio
+import errno
+import heapq
 import ipaddress
+import itertools
+import os
 import platform
+import queue
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import shlex
+import shutil
+import struct
+import tempfile
+import weakref
+import xml.etree.ElementTree as ElementTree
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class NetworkScanner:
-    def __init__(self):
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP_PAYLOAD = b'network-checker!'
+
+# Probes in flight per sweep socket are bounded by the 16-bit sequence space
+MAX_SWEEP_WINDOW = 0xFFFF
+RECEIVE_BUFFER_SIZE = 1024 * 1024
+SEND_RETRIES = 3
+
+# Operations (probes, TCP checks) in flight per event loop
+DEFAULT_MAX_CONCURRENCY = 1024
+
+# Reverse-DNS lookups in flight per event loop, and per-lookup timeout
+DNS_CONCURRENCY = 32
+DNS_TIMEOUT = 2
+
+# Liveness probes raced against ICMP for hosts that drop echo requests: TCP
+# connects to these ports (a refused connection proves the host is up too),
+# and on the local segment, ARP resolution read back from the kernel table
+LIVENESS_TCP_PORTS = (80, 443)
+ARP_TABLE_PATH = '/proc/net/arp'
+ARP_POLL_INTERVAL = 0.1
+
+# A stale neighbour entry is only re-confirmed after the kernel's
+# delay_first_probe_time (5s by default) plus a unicast ARP request, so an
+# ARP probe of a host with one waits this long (seconds) at least
+ARP_REFRESH_TIMEOUT = 7
+
+# Kernel neighbour table dump over rtnetlink: message types, request flags,
+# the NUD_REACHABLE state and the NDA_DST/NDA_LLADDR attribute types
+RTM_NEWNEIGH = 28
+RTM_GETNEIGH = 30
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_DUMP_REQUEST = 0x301
+NUD_REACHABLE = 0x02
+NDA_DST = 1
+NDA_LLADDR = 2
+
+# TCP connects (liveness and port checks) in flight across the whole process,
+# however many scans and monitor cycles run; each holds a file descriptor
+# until it completes or times out
+CONNECT_CONCURRENCY = 512
+
+# Shared pools for the few calls that have no non-blocking form; resolver
+# calls get their own so a dead PTR server cannot starve fallback pings
+_blocking_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='scanner-blocking')
+_resolver_executor = ThreadPoolExecutor(max_workers=DNS_CONCURRENCY, thread_name_prefix='scanner-dns')
+
+# nmap scans split large ranges into shards of at most this prefix length,
+# growing the shards instead when that would make more than NMAP_MAX_SHARDS
+NMAP_SHARD_PREFIX = 24
+NMAP_MAX_SHARDS = 256
+
+# nmap processes run in parallel (each driven by a worker thread), and the
+# options each nmap run gets: timing template (-T0..-T5) and optional
+# packets/second cap per process
+NMAP_WORKERS = os.cpu_count() or 2
+NMAP_TIMING = 4
+NMAP_MAX_RATE = None
+
+# Where to look for the nmap binary, first match wins
+NMAP_SEARCH_PATH = (
+    'nmap', '/usr/bin/nmap', '/usr/local/bin/nmap', '/sw/bin/nmap', '/opt/local/bin/nmap',
+    r'C:\Program Files (x86)\Nmap\nmap.exe', r'C:\Program Files\Nmap\nmap.exe'
+)
+
+# Created on first use; each shard already runs as its own nmap process, so
+# the workers only wait on it and parse its output
+_nmap_executor = None
+_nmap_lock = threading.Lock()
+
+# Distinguishes concurrent sweepers in the same process on raw sockets,
+# which receive every ICMP reply delivered to the host
+_identifier_counter = itertools.count()
+
+
+def _icmp_checksum(data):
+    """Compute the RFC 1071 internet checksum"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _build_echo_request(identifier, sequence):
+    """Build an ICMP echo request packet"""
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = _icmp_checksum(header + ICMP_PAYLOAD)
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence)
+    return header + ICMP_PAYLOAD
+
+
+def _parse_echo_reply(packet):
+    """Return (identifier, sequence) for an echo reply, or None"""
+    # Raw sockets (and datagram sockets on some platforms) include the IP header
+    if packet and packet[0] >> 4 == 4:
+        packet = packet[(packet[0] & 0x0F) * 4:]
+    if len(packet) < 8:
+        return None
+    icmp_type, _, _, identifier, sequence = struct.unpack('!BBHHH', packet[:8])
+    if icmp_type != ICMP_ECHO_REPLY:
+        return None
+    return identifier, sequence
+
+
+class ICMPSweeper:
+    """Ping many hosts from a single ICMP socket registered with an event loop.
+
+    Replies are matched to outstanding probes by ICMP identifier/sequence and
+    source address in one reader callback, so any number of concurrent probes
+    share one socket.
+    """
+
+    def __init__(self, timeout=2):
+        self.timeout = timeout
+        self.identifier = (os.getpid() + next(_identifier_counter)) & 0xFFFF
+        self.sock = None
+        self.sock_type = None
+        self.loop = None
+        self.pending = {}  # sequence -> (ip, sent_at, future)
+        self._sequences = itertools.count()
+
+    def open(self):
+        """Open a raw ICMP socket, falling back to an unprivileged datagram one"""
+        for sock_type in (socket.SOCK_RAW, socket.SOCK_DGRAM):
+            try:
+                self.sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+                self.sock_type = sock_type
+                break
+            except OSError as e:
+                last_error = e
+        else:
+            raise last_error
+
+        self.sock.setblocking(False)
+        # Large windows can burst replies faster than the reader drains them
         try:
-            self.nm = nmap.PortScanner()
-            self.nmap_available = True
-        except Exception as e:
-            logger.warning(f"Nmap not available: {e}")
-            self.nm = None
-            self.nmap_available = False
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+        except OSError as e:
+            logger.debug(f"Could not enlarge ICMP receive buffer: {e}")
+
+        self.loop = asyncio.get_running_loop()
+        try:
+            self.loop.add_reader(self.sock, self._on_readable)
+        except NotImplementedError:
+            # Proactor event loops cannot watch raw sockets
+            self.sock.close()
+            self.sock = None
+            raise OSError("event loop does not support ICMP socket readers")
+        return self
+
+    def close(self):
+        if self.sock is not None:
+            self.loop.remove_reader(self.sock)
+            self.sock.close()
+            self.sock = None
+        for _, _, future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    async def __aenter__(self):
+        return self.open()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _matches(self, identifier, sequence, source):
+        if sequence not in self.pending or self.pending[sequence][0] != source:
+            return False
+        # The kernel rewrites the identifier of datagram ICMP sockets
+        return self.sock_type == socket.SOCK_DGRAM or identifier == self.identifier
+
+    def _on_readable(self):
+        """Drain every queued reply and resolve the matching probes"""
+        while True:
+            try:
+                packet, address = self.sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug(f"ICMP receive failed: {e}")
+                return
+            received_at = time.perf_counter()
+            reply = _parse_echo_reply(packet)
+            if reply is None or not self._matches(reply[0], reply[1], address[0]):
+                continue
+            _, sent_at, future = self.pending.pop(reply[1])
+            if not future.done():
+                future.set_result((received_at - sent_at) * 1000)
+
+    def _next_sequence(self):
+        while True:
+            sequence = next(self._sequences) & 0xFFFF
+            if sequence not in self.pending:
+                return sequence
+
+    async def _send(self, ip, sequence):
+        """Send an echo request, backing off briefly if the send buffer is full"""
+        packet = _build_echo_request(self.identifier, sequence)
+        for _ in range(SEND_RETRIES):
+            try:
+                self.sock.sendto(packet, (ip, 0))
+                return
+            except OSError as e:
+                if e.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                    raise
+                await asyncio.sleep(0.01)
+        self.sock.sendto(packet, (ip, 0))
+
+    async def ping(self, ip, timeout=None):
+        """Probe one address and return its RTT in ms, or None on timeout"""
+        if len(self.pending) >= MAX_SWEEP_WINDOW:
+            raise OSError("ICMP sequence space exhausted")
+        sequence = self._next_sequence()
+        future = self.loop.create_future()
+        self.pending[sequence] = (ip, time.perf_counter(), future)
+        try:
+            await self._send(ip, sequence)
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            return None
+        except OSError as e:
+            logger.debug(f"Echo request to {ip} failed: {e}")
+            return None
+        finally:
+            entry = self.pending.get(sequence)
+            if entry is not None and entry[2] is future:
+                del self.pending[sequence]
+
+
+class HostnameCache:
+    """Thread-safe bounded LRU cache of reverse-DNS results.
+
+    Failed lookups are cached too, with a shorter TTL, so hosts without a PTR
+    record are not re-resolved on every scan.
+    """
+
+    def __init__(self, maxsize=4096, ttl=3600, negative_ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # ip -> (hostname, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, ip_address):
+        """Return (hit, hostname); hostname is None for a cached failure"""
+        with self._lock:
+            entry = self._entries.get(ip_address)
+            if entry is None:
+                return False, None
+            if entry[1] <= time.monotonic():
+                del self._entries[ip_address]
+                return False, None
+            self._entries.move_to_end(ip_address)
+            return True, entry[0]
+
+    def set(self, ip_address, hostname):
+        ttl = self.ttl if hostname else self.negative_ttl
+        with self._lock:
+            self._entries[ip_address] = (hostname, time.monotonic() + ttl)
+            self._entries.move_to_end(ip_address)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ConnectionSlots:
+    """Process-wide limit on TCP connects in flight, shared by every event loop.
+
+    Scans and monitor cycles each run on their own loop, so an
+    asyncio.Semaphore per loop would multiply the limit. Use as
+    `async with slots:`; waiters are served in order, and a waiter on
+    another loop is woken thread-safely.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._in_use = 0
+        self._waiters = deque()  # (loop, future)
+        self._lock = threading.Lock()
+
+    @property
+    def in_use(self):
+        """Slots currently held, including ones on their way to a waiter"""
+        return self._in_use
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_use < self.limit and not self._waiters:
+                self._in_use += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            # A waiter no longer queued was handed a slot by release(), whether
+            # or not its wakeup ran; it must be passed on
+            with self._lock:
+                granted = waiter not in self._waiters
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                self.release()
+            raise
+
+    def _wake(self, future):
+        if not future.done():
+            future.set_result(None)
+
+    def release(self):
+        """Free a slot, handing it straight to the longest waiter if there is one.
+
+        The handover is decided here, under the lock, so a slot is never lost
+        to a wakeup that does not run.
+        """
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._wake, future)
+                    return
+                except RuntimeError:
+                    # The waiter's loop has been closed
+                    continue
+            self._in_use -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def _read_neighbours():
+    """IPv4 entries of the kernel neighbour table as {ip: (mac, NUD state)} over rtnetlink"""
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, 0) as sock:
+        sock.bind((0, 0))
+        # nlmsghdr followed by an ndmsg selecting the IPv4 table
+        sock.send(struct.pack('=LHHLL', 28, RTM_GETNEIGH, NLM_F_DUMP_REQUEST, 1, 0)
+                  + struct.pack('=BBHiHBB', socket.AF_INET, 0, 0, 0, 0, 0, 0))
+        entries = {}
+        while True:
+            data = sock.recv(65536)
+            offset = 0
+            while offset + 16 <= len(data):
+                length, message_type = struct.unpack_from('=LH', data, offset)
+                if message_type == NLMSG_DONE:
+                    return entries
+                if message_type == NLMSG_ERROR or length < 16:
+                    raise OSError("neighbour table dump failed")
+                if message_type == RTM_NEWNEIGH:
+                    state = struct.unpack_from('=H', data, offset + 24)[0]
+                    attributes = {}
+                    position = offset + 28
+                    while position + 4 <= offset + length:
+                        size, kind = struct.unpack_from('=HH', data, position)
+                        if size < 4:
+                            break
+                        attributes[kind] = data[position + 4:position + size]
+                        position += (size + 3) & ~3
+                    if len(attributes.get(NDA_DST, b'')) == 4 and NDA_LLADDR in attributes:
+                        ip_address = socket.inet_ntoa(attributes[NDA_DST])
+                        entries[ip_address] = (':'.join(f'{byte:02x}' for byte in attributes[NDA_LLADDR]), state)
+                offset += (length + 3) & ~3
+
+
+def _read_arp_table():
+    """Resolved entries of the kernel ARP table as {ip: (mac, NUD state)}, or None if it cannot be read.
+
+    The state comes from the rtnetlink neighbour table; where that cannot
+    be read, /proc/net/arp gives the resolved entries with a state of None,
+    as it does not say how fresh they are.
+    """
+    try:
+        return _read_neighbours()
+    except (OSError, AttributeError, struct.error) as e:
+        logger.debug(f"Neighbour table unavailable, reading {ARP_TABLE_PATH}: {e}")
+    try:
+        with open(ARP_TABLE_PATH) as table:
+            lines = table.readlines()[1:]
+    except OSError:
+        return None
+    entries = {}
+    for line in lines:
+        # IP address, HW type, Flags, HW address, Mask, Device; flag 0x2 marks a resolved entry
+        fields = line.split()
+        if len(fields) >= 4 and int(fields[2], 16) & 0x2 and fields[3] != '00:00:00:00:00:00':
+            entries[fields[0]] = (fields[3], None)
+    return entries
+
+
+# Shared by every NetworkScanner (scans, single-device checks, DeviceMonitor)
+default_hostname_cache = HostnameCache()
+_connect_slots = ConnectionSlots(CONNECT_CONCURRENCY)
+
+
+def run_async(coroutine):
+    """Run a coroutine to completion on a private selector event loop"""
+    # Selector loops can watch raw sockets on every platform, unlike Proactor
+    loop = asyncio.SelectorEventLoop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def iterate_async(async_iterable):
+    """Consume an async iterator from synchronous code, one item at a time"""
+    loop = asyncio.SelectorEventLoop()
+    iterator = async_iterable.__aiter__()
+    try:
+        while True:
+            try:
+                item = loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if hasattr(iterator, 'aclose'):
+            loop.run_until_complete(iterator.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def count_hosts(network, exclude=()):
+    """Number of addresses network.hosts() yields, less any inside `exclude`"""
+    total = network.num_addresses if network.prefixlen >= 31 else network.num_addresses - 2
+    for excluded in ipaddress.collapse_addresses(exclude):
+        if network.subnet_of(excluded):
+            return 0
+        if excluded.subnet_of(network):
+            total -= excluded.num_addresses
+            if network.prefixlen < 31:
+                # hosts() never yields these two, so they were not counted
+                total += (network.network_address in excluded) + (network.broadcast_address in excluded)
+    return total
+
+
+def _iter_hosts(network, exclude=(), cancel_event=None):
+    """network.hosts() minus excluded networks, stopping early once cancelled"""
+    ranges = [
+        (int(excluded.network_address), int(excluded.broadcast_address))
+        for excluded in ipaddress.collapse_addresses(exclude) if excluded.overlaps(network)
+    ]
+    for host in network.hosts():
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        if ranges:
+            value = int(host)
+            if any(low <= value <= high for low, high in ranges):
+                continue
+        yield host
+
+
+class ScanProgress:
+    """Live counters for a running scan.
+
+    Updated by the scanning thread and read from others; each counter only
+    ever grows, so a reader sees a consistent-enough snapshot without locks.
+    """
+
+    def __init__(self, network_range=None, scan_type='ping'):
+        self.network_range = network_range
+        self.scan_type = scan_type
+        self.hosts_total = 0
+        self.probes_sent = 0
+        self.probes_done = 0
+        self.devices_found = 0
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'network_range': self.network_range,
+            'scan_type': self.scan_type,
+            'hosts_total': self.hosts_total,
+            'probes_sent': self.probes_sent,
+            'probes_done': self.probes_done,
+            'devices_found': self.devices_found,
+            'percent': round(100 * self.probes_done / self.hosts_total, 1) if self.hosts_total else 0,
+            'elapsed': elapsed,
+            'finished': self.finished_at is not None
+        }
+
+
+class AsyncNetworkScanner:
+    """asyncio scanning core shared by the NetworkScanner sync API.
+
+    ICMP probes, reverse-DNS lookups and TCP checks run as tasks on a single
+    event loop, with at most `max_concurrency` hosts being probed and
+    `DNS_CONCURRENCY` lookups in flight per loop, and `CONNECT_CONCURRENCY`
+    TCP connects in flight across all loops. Blocking fallbacks (pythonping, resolver calls) run on
+    small shared thread pools instead of a thread per host.
+    """
+
+    def __init__(self, scanner, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 liveness_ports=LIVENESS_TCP_PORTS, arp=True):
+        self.scanner = scanner
+        self.max_concurrency = max_concurrency
+        self.liveness_ports = tuple(liveness_ports)
+        self.arp = arp
+        self._limiters = weakref.WeakKeyDictionary()
+        self._arp_cache = (0, None)
+
+    def _limiter(self, kind='probe'):
+        """Return the concurrency limit of a kind for the running event loop.
+
+        'connect' is the process-wide ConnectionSlots, shared by every loop.
+        """
+        if kind == 'connect':
+            return _connect_slots
+        loop = asyncio.get_running_loop()
+        limiters = self._limiters.get(loop)
+        if limiters is None:
+            limiters = self._limiters[loop] = {
+                'probe': asyncio.Semaphore(self.max_concurrency),
+                'dns': asyncio.Semaphore(DNS_CONCURRENCY)
+            }
+        return limiters[kind]
+
+    async def _bounded_map(self, function, items):
+        """Apply an async function to items lazily, yielding results as they complete.
+
+        Only `max_concurrency` tasks exist at any time, so arbitrarily large
+        inputs (such as the hosts of a /16) are never materialised.
+        """
+        items = iter(items)
+        tasks = set()
+        try:
+            for item in items:
+                tasks.add(asyncio.ensure_future(function(item)))
+                if len(tasks) >= self.max_concurrency:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # Wait for cancelled tasks to unwind, so the connect slots they
+            # hold are released before the loop is closed
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _open_sweeper(self, timeout):
+        """Open a shared ICMP socket, or return None to use blocking pings"""
+        try:
+            return ICMPSweeper(timeout=timeout).open()
+        except OSError as e:
+            logger.debug(f"ICMP sweep unavailable, using threaded ping: {e}")
+            return None
+
+    async def _icmp_alive(self, sweeper, ip_address, timeout):
+        if sweeper is None:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                _blocking_executor, self.scanner._ping_host_blocking, ip_address, timeout
+            )
+            rtt = result['response_time'] if result['status'] == 'online' else None
+        else:
+            rtt = await sweeper.ping(ip_address, timeout)
+        return None if rtt is None else {'probe': 'icmp', 'response_time': rtt}
+
+    async def _tcp_alive(self, ip_address, port, timeout):
+        try:
+            async with self._limiter('connect'):
+                started = time.perf_counter()
+                try:
+                    _, writer = await asyncio.wait_for(asyncio.open_connection(ip_address, port), timeout)
+                    writer.close()
+                except ConnectionRefusedError:
+                    # The host itself answered the SYN with a reset
+                    pass
+                rtt = (time.perf_counter() - started) * 1000
+        except asyncio.TimeoutError:
+            return None
+        except OSError as e:
+            if e.errno in (errno.EMFILE, errno.ENFILE):
+                # Out of file descriptors says nothing about the host
+                logger.warning(f"TCP probe of {ip_address} failed, out of file descriptors: {e}")
+            return None
+        return {'probe': 'tcp', 'response_time': rtt}
+
+    def _arp_table(self):
+        """Kernel ARP table, re-read at most every ARP_POLL_INTERVAL however many probes poll it"""
+        read_at, table = self._arp_cache
+        if time.monotonic() - read_at >= ARP_POLL_INTERVAL:
+            table = _read_arp_table()
+            self._arp_cache = (time.monotonic(), table)
+        return table
+
+    def _on_local_segment(self, ip_address):
+        try:
+            return ipaddress.IPv4Address(ip_address) in ipaddress.IPv4Network(self.scanner.local_network, strict=False)
+        except ValueError:
+            return False
+
+    async def _arp_alive(self, ip_address, timeout):
+        """Ask the kernel to resolve an address and report it alive once the neighbour entry is confirmed.
+
+        A REACHABLE entry was confirmed by the host within the kernel's
+        reachable time, so it counts straight away. A stale entry is
+        refreshed by the probe's own datagram, which takes the kernel up to
+        ARP_REFRESH_TIMEOUT. An entry of unknown freshness (from
+        /proc/net/arp) only counts if it appears during the probe.
+        """
+        table = self._arp_table()
+        if table is None:
+            return None
+        known = table.get(ip_address)
+        if known is not None and known[1] == NUD_REACHABLE:
+            return {'probe': 'arp', 'response_time': None, 'mac_address': known[0]}
+
+        # Any datagram makes the kernel resolve the address, or re-confirm a stale entry
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.setblocking(False)
+                sock.sendto(b'', (ip_address, 9))
+        except OSError:
+            pass
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout if known is None else max(timeout, ARP_REFRESH_TIMEOUT))
+        while loop.time() < deadline:
+            await asyncio.sleep(ARP_POLL_INTERVAL)
+            entry = (self._arp_table() or {}).get(ip_address)
+            if entry is not None and (entry[1] == NUD_REACHABLE or (entry[1] is None and known is None)):
+                # Polling granularity makes the timing meaningless as a latency
+                return {'probe': 'arp', 'response_time': None, 'mac_address': entry[0]}
+        return None
+
+    async def _probe(self, sweeper, ip_address, timeout):
+        """Decide whether a host is up, racing ICMP against TCP connect and ARP probes.
+
+        The first probe to get an answer wins and the others are cancelled;
+        the host is offline only if none answers. Each probe times itself
+        out, and a TCP probe's `timeout` only starts once it has a connect
+        slot, so probes queued behind a busy sweep still get to send.
+        """
+        async with self._limiter():
+            probes = {asyncio.ensure_future(self._icmp_alive(sweeper, ip_address, timeout))}
+            probes.update(
+                asyncio.ensure_future(self._tcp_alive(ip_address, port, timeout)) for port in self.liveness_ports
+            )
+            if self.arp and self._on_local_segment(ip_address):
+                probes.add(asyncio.ensure_future(self._arp_alive(ip_address, timeout)))
+
+            try:
+                while probes:
+                    done, probes = await asyncio.wait(probes, return_when=asyncio.FIRST_COMPLETED)
+                    for probe in done:
+                        answer = probe.result() if probe.exception() is None else None
+                        if answer is not None:
+                            return {
+                                'ip': ip_address,
+                                'status': 'online',
+                                'response_time': answer['response_time'],
+                                'probe': answer['probe'],
+                                'mac_address': answer.get('mac_address')
+                            }
+            finally:
+                for probe in probes:
+                    probe.cancel()
+                if probes:
+                    await asyncio.gather(*probes, return_exceptions=True)
+
+        return {
+            'ip': ip_address,
+            'status': 'offline',
+            'response_time': None
+        }
+
+    async def ping_host(self, ip_address, timeout=2):
+        """Ping a single host and return response time"""
+        sweeper = await self._open_sweeper(timeout)
+        try:
+            return await self._probe(sweeper, ip_address, timeout)
+        finally:
+            if sweeper is not None:
+                sweeper.close()
+
+    async def iter_ping(self, ip_addresses, timeout=2):
+        """Ping an iterable of addresses, yielding results as they complete"""
+        sweeper = await self._open_sweeper(timeout)
+        results = self._bounded_map(lambda ip: self._probe(sweeper, str(ip), timeout), ip_addresses)
+        try:
+            async for result in results:
+                yield result
+        finally:
+            await results.aclose()
+            if sweeper is not None:
+                sweeper.close()
+
+    async def ping_hosts(self, ip_addresses, timeout=2):
+        """Ping many hosts concurrently and return a result per host"""
+        return [result async for result in self.iter_ping(ip_addresses, timeout)]
+
+    async def resolve_hostname(self, ip_address, timeout=DNS_TIMEOUT):
+        """Reverse-resolve an address through the shared hostname cache.
+
+        Lookups give up after `timeout` seconds; failures and timeouts are
+        cached as negative results.
+        """
+        cache = self.scanner.hostname_cache
+        hit, hostname = cache.get(ip_address)
+        if hit:
+            return hostname
+
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._limiter('dns'):
+                hostname, _ = await asyncio.wait_for(
+                    loop.run_in_executor(
+                        _resolver_executor, socket.getnameinfo, (ip_address, 0), socket.NI_NAMEREQD
+                    ),
+                    timeout
+                )
+        except (asyncio.TimeoutError, OSError):
+            hostname = None
+        cache.set(ip_address, hostname)
+        return hostname
+
+    async def resolve_hostnames(self, ip_addresses, timeout=DNS_TIMEOUT):
+        """Reverse-resolve many addresses concurrently, returning {ip: hostname}"""
+        ip_addresses = list(ip_addresses)
+        hostnames = await asyncio.gather(
+            *(self.resolve_hostname(ip, timeout) for ip in ip_addresses)
+        )
+        return dict(zip(ip_addresses, hostnames))
+
+    async def check_tcp_port(self, ip_address, port, timeout=1):
+        """Return True if a TCP connection to ip_address:port succeeds"""
+        try:
+            async with self._limiter('connect'):
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(ip_address, port), timeout
+                )
+            writer.close()
+            return True
+        except (asyncio.TimeoutError, OSError):
+            return False
+
+    async def _scan_host(self, sweeper, ip_address, timeout, tcp_ports, progress=None):
+        """Probe stage: ping a host and check its TCP ports if it is online"""
+        if progress is not None:
+            progress.probes_sent += 1
+        try:
+            result = await self._probe(sweeper, ip_address, timeout)
+        finally:
+            if progress is not None:
+                progress.probes_done += 1
+        if result['status'] != 'online':
+            return None
+
+        device_info = {
+            'ip_address': ip_address,
+            'hostname': None,
+            'status': result['status'],
+            'response_time': result['response_time'],
+            'mac_address': result.get('mac_address'),
+            'vendor': None,
+            'device_type': 'Unknown'
+        }
+        if tcp_ports:
+            port_states = await asyncio.gather(
+                *(self.check_tcp_port(ip_address, port) for port in tcp_ports)
+            )
+            device_info['open_ports'] = [
+                port for port, is_open in zip(tcp_ports, port_states) if is_open
+            ]
+        return device_info
+
+    async def _add_hostname(self, device_info):
+        """Resolve stage: fill in the hostname of a discovered device"""
+        device_info['hostname'] = await self.resolve_hostname(device_info['ip_address'])
+        logger.info(f"Found device: {device_info['ip_address']} ({device_info['hostname']})")
+        return device_info
+
+    async def iter_devices(self, ip_addresses, timeout=2, tcp_ports=None, progress=None):
+        """Discover online devices, yielding each once its hostname is resolved.
+
+        Probing and reverse DNS are separate pipeline stages: online hosts are
+        handed to resolver tasks as soon as they answer, so slow PTR lookups
+        never hold up the sweep. A ScanProgress passed in is kept up to date.
+        """
+        sweeper = await self._open_sweeper(timeout)
+        lookups = set()
+        resolved = deque()
+        hosts = self._bounded_map(
+            lambda ip: self._scan_host(sweeper, str(ip), timeout, tcp_ports, progress), ip_addresses
+        )
+        try:
+            async for device_info in hosts:
+                if device_info is not None:
+                    lookup = asyncio.ensure_future(self._add_hostname(device_info))
+                    lookup.add_done_callback(resolved.append)
+                    lookups.add(lookup)
+                while resolved:
+                    lookup = resolved.popleft()
+                    lookups.discard(lookup)
+                    if progress is not None:
+                        progress.devices_found += 1
+                    yield lookup.result()
+
+            while lookups:
+                done, lookups = await asyncio.wait(lookups, return_when=asyncio.FIRST_COMPLETED)
+                for lookup in done:
+                    if progress is not None:
+                        progress.devices_found += 1
+                    yield lookup.result()
+        finally:
+            # Abandoned part way: unwind the probes and lookups still running
+            # before the sweep socket closes under them
+            await hosts.aclose()
+            for lookup in lookups:
+                lookup.cancel()
+            if lookups:
+                await asyncio.gather(*lookups, return_exceptions=True)
+            if sweeper is not None:
+                sweeper.close()
+
+    async def scan_network(self, network_range, timeout=2, tcp_ports=None):
+        """Ping-sweep a network range and return the scan result dict"""
+        start_time = time.time()
+        network = ipaddress.IPv4Network(network_range, strict=False)
+
+        online_devices = [
+            device_info async for device_info in self.iter_devices(network.hosts(), timeout, tcp_ports)
+        ]
+
+        return {
+            'devices': online_devices,
+            'scan_type': 'ping',
+            'network_range': network_range,
+            'duration': time.time() - start_time,
+            'devices_found': len(online_devices)
+        }
+
+def _nmap_pool():
+    """Shared pool of threads that run nmap shards"""
+    global _nmap_executor
+    with _nmap_lock:
+        if _nmap_executor is None:
+            _nmap_executor = ThreadPoolExecutor(max_workers=NMAP_WORKERS, thread_name_prefix='scanner-nmap')
+        return _nmap_executor
+
+
+def _nmap_shards(network, exclude=()):
+    """Split a network into (shard, excludes inside it, hosts to scan) for parallel nmap runs"""
+    prefix = max(network.prefixlen, min(NMAP_SHARD_PREFIX, network.prefixlen + NMAP_MAX_SHARDS.bit_length() - 1))
+    shards = [network] if prefix == network.prefixlen else network.subnets(new_prefix=prefix)
+    exclude = list(ipaddress.collapse_addresses(exclude))
+    for shard in shards:
+        if any(shard.subnet_of(excluded) for excluded in exclude):
+            continue
+        shard_exclude = [excluded for excluded in exclude if excluded.overlaps(shard)]
+        if shard == network:
+            host_count = count_hosts(shard, shard_exclude)
+        else:
+            # Shard edges are ordinary hosts of the network; only its own edges are skipped
+            host_count = shard.num_addresses - sum(excluded.num_addresses for excluded in shard_exclude) - sum(
+                address in shard and not any(address in excluded for excluded in shard_exclude)
+                for address in (network.network_address, network.broadcast_address)
+            )
+        yield shard, shard_exclude, host_count
+
+
+def find_nmap():
+    """Path of the nmap binary, or None if it is not installed"""
+    for candidate in NMAP_SEARCH_PATH:
+        path = shutil.which(candidate)
+        if path:
+            return path
+    return None
+
+
+def iter_nmap_hosts(nmap_path, target, arguments):
+    """Run nmap and yield each live host's address fields as nmap reports it.
+
+    nmap writes its XML report to stdout and it is parsed incrementally,
+    clearing every <host> once read, so memory stays at one host record
+    however large the target is.
+    """
+    command = [nmap_path, '-oX', '-'] + shlex.split(arguments) + [target]
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+        
+        def check_exit():
+            if process.wait() != 0:
+                errors.seek(0)
+                raise RuntimeError(f"nmap exited with {process.returncode}: {errors.read().decode(errors='replace').strip()}")
+        
+        try:
+            root = None
+            try:
+                for event, element in ElementTree.iterparse(process.stdout, events=('start', 'end')):
+                    if root is None:
+                        root = element
+                    if event != 'end' or element.tag != 'host':
+                        continue
+                    
+                    status = element.find('status')
+                    if status is not None and status.get('state') == 'up':
+                        addresses = {address.get('addrtype'): address for address in element.findall('address')}
+                        hostname = element.find('hostnames/hostname')
+                        mac = addresses.get('mac')
+                        if 'ipv4' in addresses:
+                            yield {
+                                'ip_address': addresses['ipv4'].get('addr'),
+                                'hostname': hostname.get('name') if hostname is not None else None,
+                                'mac_address': mac.get('addr') if mac is not None else None,
+                                'vendor': mac.get('vendor', 'Unknown') if mac is not None else None
+                            }
+                    root.clear()
+            except ElementTree.ParseError:
+                # Truncated or missing XML: nmap's own error says more, if it failed
+                check_exit()
+                raise
+            check_exit()
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+
+def _run_nmap_shard(nmap_path, target, arguments, results):
+    """Worker thread: nmap one shard, putting each live host on the results queue as it is parsed.
+
+    Always finishes with ('done', target, error) so the parent can account
+    for every shard, even one that failed.
+    """
+    error = None
+    try:
+        for host in iter_nmap_hosts(nmap_path, target, arguments):
+            results.put(('host', host))
+    except Exception as e:
+        error = str(e)
+    finally:
+        results.put(('done', target, error))
+
+
+class NetworkScanner:
+    def __init__(self, hostname_cache=None, liveness_ports=LIVENESS_TCP_PORTS):
+        self.nmap_path = find_nmap()
+        self.nmap_available = self.nmap_path is not None
+        if not self.nmap_available:
+            logger.warning("Nmap not available: nmap binary not found")
+        self.hostname_cache = hostname_cache or default_hostname_cache
+        self.async_scanner = AsyncNetworkScanner(self, liveness_ports=liveness_ports)
         self.local_network = self.get_local_network()
         
     def get_local_network(self):
@@ -40,6 +1011,10 @@ class NetworkScanner:
 
     def ping_host(self, ip_address, timeout=2):
         """Ping a single host and return response time"""
+        return run_async(self.async_scanner.ping_host(ip_address, timeout))
+
+    def _ping_host_blocking(self, ip_address, timeout=2):
+        """Ping a single host with pythonping when no ICMP socket can be opened"""
         try:
             response = ping(ip_address, count=1, timeout=timeout)
             if response.success():
@@ -64,11 +1039,66 @@ class NetworkScanner:
 
     def get_hostname(self, ip_address):
         """Get hostname for an IP address"""
-        try:
-            hostname = socket.gethostbyaddr(ip_address)[0]
+        return run_async(self.async_scanner.resolve_hostname(ip_address))
+
+    def get_hostnames(self, ip_addresses):
+        """Resolve many addresses concurrently, returning {ip: hostname}"""
+        return run_async(self.async_scanner.resolve_hostnames(ip_addresses))
+
+    def _merge_hostname(self, ip_address, hostname):
+        """Share a hostname learned elsewhere (e.g. by nmap) through the cache"""
+        if hostname:
+            self.hostname_cache.set(ip_address, hostname)
             return hostname
-        except Exception:
-            return None
+        _, cached = self.hostname_cache.get(ip_address)
+        return cached
+
+    def ping_sweep(self, ip_addresses, timeout=2):
+        """Ping many hosts at once and return a result per host"""
+        return run_async(self.async_scanner.ping_hosts(ip_addresses, timeout))
+
+    def iter_ping_sweep(self, network_range=None, timeout=2):
+        """Stream ping results for a network range of any size.
+
+        Addresses are read lazily from the network and only a bounded number
+        of probes are in flight, so memory stays flat for /16 and larger ranges.
+        """
+        if network_range is None:
+            network_range = self.local_network
+        network = ipaddress.IPv4Network(network_range, strict=False)
+        yield from iterate_async(self.async_scanner.iter_ping(network.hosts(), timeout))
+
+    def iter_scan(self, network_range=None, scan_type='ping', progress=None, timeout=2,
+                  exclude=(), cancel_event=None):
+        """Yield each discovered device as soon as it is found.
+
+        Ping scans stream straight from the async sweep; nmap scans stream
+        each shard's hosts as it finishes. Pass a ScanProgress to watch
+        probes sent/done and devices found from another thread. Addresses
+        inside `exclude` networks are skipped, and setting `cancel_event`
+        stops further probes (or nmap shards) from starting.
+        """
+        if network_range is None:
+            network_range = self.local_network
+        network = ipaddress.IPv4Network(network_range, strict=False)
+        exclude = [ipaddress.IPv4Network(excluded, strict=False) for excluded in exclude]
+        if progress is None:
+            progress = ScanProgress(network_range, scan_type)
+        progress.hosts_total = count_hosts(network, exclude)
+        
+        try:
+            if scan_type == 'nmap' and self.nmap_available:
+                for device_info in self.iter_scan_nmap(
+                    network_range, exclude=exclude, progress=progress, cancel_event=cancel_event
+                ):
+                    progress.devices_found += 1
+                    yield device_info
+            else:
+                yield from iterate_async(self.async_scanner.iter_devices(
+                    _iter_hosts(network, exclude, cancel_event), timeout, progress=progress
+                ))
+        finally:
+            progress.finished_at = time.time()
 
     def scan_network_ping(self, network_range=None):
         """Fast network scan using ping"""
@@ -76,49 +1106,11 @@ class NetworkScanner:
             network_range = self.local_network
         
         logger.info(f"Starting ping scan of {network_range}")
-        start_time = time.time()
         
         try:
-            network = ipaddress.IPv4Network(network_range, strict=False)
-            hosts = list(network.hosts())
-            
-            # Limit to reasonable size for ping scan
-            if len(hosts) > 254:
-                hosts = hosts[:254]
-                
-            online_devices = []
-            
-            # Use ThreadPoolExecutor for concurrent pings
-            with ThreadPoolExecutor(max_workers=50) as executor:
-                future_to_ip = {executor.submit(self.ping_host, str(ip)): str(ip) for ip in hosts}
-                
-                for future in as_completed(future_to_ip):
-                    result = future.result()
-                    if result['status'] == 'online':
-                        # Get hostname
-                        hostname = self.get_hostname(result['ip'])
-                        device_info = {
-                            'ip_address': result['ip'],
-                            'hostname': hostname,
-                            'status': result['status'],
-                            'response_time': result['response_time'],
-                            'mac_address': None,
-                            'vendor': None,
-                            'device_type': 'Unknown'
-                        }
-                        online_devices.append(device_info)
-                        logger.info(f"Found device: {result['ip']} ({hostname})")
-            
-            duration = time.time() - start_time
-            logger.info(f"Ping scan completed in {duration:.2f} seconds. Found {len(online_devices)} devices.")
-            
-            return {
-                'devices': online_devices,
-                'scan_type': 'ping',
-                'network_range': network_range,
-                'duration': duration,
-                'devices_found': len(online_devices)
-            }
+            result = run_async(self.async_scanner.scan_network(network_range))
+            logger.info(f"Ping scan completed in {result['duration']:.2f} seconds. Found {result['devices_found']} devices.")
+            return result
             
         except Exception as e:
             logger.error(f"Error during ping scan: {e}")
@@ -130,9 +1122,81 @@ class NetworkScanner:
                 'devices_found': 0
             }
 
-    def scan_network_nmap(self, network_range=None, scan_type='-sn'):
+    def iter_scan_nmap(self, network_range=None, scan_type='-sn', exclude=(), progress=None,
+                       cancel_event=None, timing=NMAP_TIMING, max_rate=NMAP_MAX_RATE):
+        """Run nmap over a range in parallel shards, yielding hosts as each shard finishes.
+
+        Ranges larger than a /24 are split into up to NMAP_MAX_SHARDS
+        sub-networks, each scanned by its own nmap process run from the
+        worker pool. `timing` and `max_rate` are passed to every nmap run.
+        """
+        if network_range is None:
+            network_range = self.local_network
+        network = ipaddress.IPv4Network(network_range, strict=False)
+        
+        base_arguments = f"{scan_type} -T{timing}"
+        if max_rate:
+            base_arguments += f" --max-rate {max_rate}"
+        
+        executor = _nmap_pool()
+        results = queue.Queue()
+        pending = {}
+        for shard, shard_exclude, host_count in _nmap_shards(network, exclude):
+            arguments = base_arguments
+            if shard_exclude:
+                arguments += f" --exclude {','.join(str(excluded) for excluded in shard_exclude)}"
+            future = executor.submit(_run_nmap_shard, self.nmap_path, str(shard), arguments, results)
+            pending[str(shard)] = (future, host_count)
+            if progress is not None:
+                progress.probes_sent += host_count
+        
+        try:
+            while pending:
+                if cancel_event is not None and cancel_event.is_set():
+                    for target, (future, _) in list(pending.items()):
+                        if future.cancel():
+                            del pending[target]
+                    if not pending:
+                        break
+                
+                try:
+                    message = results.get(timeout=0.5)
+                except queue.Empty:
+                    # A shard that failed outside nmap itself never reports 'done'
+                    for target, (future, _) in list(pending.items()):
+                        if future.done() and future.exception() is not None:
+                            logger.error(f"nmap shard {target} failed: {future.exception()}")
+                            del pending[target]
+                    continue
+                
+                if message[0] == 'host':
+                    host = message[1]
+                    hostname = self._merge_hostname(host['ip_address'], host['hostname'])
+                    device_info = {
+                        'ip_address': host['ip_address'],
+                        'hostname': hostname,
+                        'status': 'online',
+                        'response_time': None,
+                        'mac_address': host['mac_address'],
+                        'vendor': host['vendor'],
+                        'device_type': self.guess_device_type(hostname) if hostname else 'Unknown'
+                    }
+                    logger.info(f"Found device: {host['ip_address']} ({hostname})")
+                    yield device_info
+                else:
+                    _, target, error = message
+                    if error:
+                        logger.error(f"nmap shard {target} failed: {error}")
+                    _, host_count = pending.pop(target, (None, 0))
+                    if progress is not None:
+                        progress.probes_done += host_count
+        finally:
+            for future, _ in pending.values():
+                future.cancel()
+
+    def scan_network_nmap(self, network_range=None, scan_type='-sn', exclude=()):
         """Detailed network scan using nmap"""
-        if not self.nmap_available or self.nm is None:
+        if not self.nmap_available:
             logger.warning("Nmap not available, falling back to ping scan")
             return self.scan_network_ping(network_range)
             
@@ -143,35 +1207,7 @@ class NetworkScanner:
         start_time = time.time()
         
         try:
-            # Perform nmap scan
-            self.nm.scan(hosts=network_range, arguments=scan_type)
-            
-            devices = []
-            for host in self.nm.all_hosts():
-                if self.nm[host].state() == 'up':
-                    device_info = {
-                        'ip_address': host,
-                        'hostname': self.nm[host].hostname() or None,
-                        'status': 'online',
-                        'response_time': None,
-                        'mac_address': None,
-                        'vendor': None,
-                        'device_type': 'Unknown'
-                    }
-                    
-                    # Get MAC address and vendor if available
-                    if 'mac' in self.nm[host]['addresses']:
-                        device_info['mac_address'] = self.nm[host]['addresses']['mac']
-                        device_info['vendor'] = self.nm[host]['vendor'].get(
-                            self.nm[host]['addresses']['mac'], 'Unknown'
-                        )
-                    
-                    # Try to determine device type based on hostname or other factors
-                    if device_info['hostname']:
-                        device_info['device_type'] = self.guess_device_type(device_info['hostname'])
-                    
-                    devices.append(device_info)
-                    logger.info(f"Found device: {host} ({device_info['hostname']})")
+            devices = list(self.iter_scan_nmap(network_range, scan_type, exclude))
             
             duration = time.time() - start_time
             logger.info(f"Nmap scan completed in {duration:.2f} seconds. Found {len(devices)} devices.")
@@ -242,22 +1278,18 @@ class NetworkScanner:
                 'hostname': self.get_hostname(ip_address),
                 'status': ping_result['status'],
                 'response_time': ping_result['response_time'],
-                'mac_address': None,
+                'mac_address': ping_result.get('mac_address'),
                 'vendor': None,
                 'device_type': 'Unknown'
             }
             
             # Try to get more details with nmap (lightweight scan)
-            if self.nmap_available and self.nm is not None:
+            if self.nmap_available:
                 try:
-                    self.nm.scan(hosts=ip_address, arguments='-sn')
-                    if ip_address in self.nm.all_hosts():
-                        host = self.nm[ip_address]
-                        if 'mac' in host['addresses']:
-                            device_info['mac_address'] = host['addresses']['mac']
-                            device_info['vendor'] = host['vendor'].get(
-                                host['addresses']['mac'], 'Unknown'
-                            )
+                    for host in iter_nmap_hosts(self.nmap_path, ip_address, '-sn'):
+                        if host['ip_address'] == ip_address and host['mac_address']:
+                            device_info['mac_address'] = host['mac_address']
+                            device_info['vendor'] = host['vendor']
                 except Exception as e:
                     logger.debug(f"Nmap scan failed for {ip_address}: {e}")
             
@@ -306,6 +1338,112 @@ class NetworkScanner:
         
         return interfaces
 
+class PollingScheduler:
+    """Heap of next-due check times with an adaptive interval per device.
+
+    A device is rechecked after `min_interval` when its status changes, then
+    backs off by `backoff` per unchanged check: online devices up to
+    `stable_backoff_limit` times their base interval, offline ones up to
+    `offline_backoff_limit` times it (never beyond `max_interval`). The base
+    interval comes from the device's group, or `default_interval` when the
+    group does not set one.
+    """
+
+    def __init__(self, default_interval=300, min_interval=30, max_interval=3600,
+                 backoff=1.5, stable_backoff_limit=2, offline_backoff_limit=12):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.stable_backoff_limit = stable_backoff_limit
+        self.offline_backoff_limit = offline_backoff_limit
+        self._heap = []  # (due_at, device_id); stale entries are skipped on pop
+        self._entries = {}  # device_id -> schedule state
+
+    def __len__(self):
+        return len(self._entries)
+
+    def sync(self, devices, group_intervals, now=None):
+        """Track new devices (due immediately), forget removed ones and pick up group intervals"""
+        now = time.time() if now is None else now
+        seen = set()
+        for device in devices:
+            device_id = device['id']
+            seen.add(device_id)
+            base_interval = self._base_interval(group_intervals.get(device['group_id']))
+            entry = self._entries.get(device_id)
+            if entry is None:
+                self._entries[device_id] = {
+                    'device': device,
+                    'status': 'online' if device['is_active'] else 'offline',
+                    'base_interval': base_interval,
+                    'interval': base_interval,
+                    'due_at': now
+                }
+                heapq.heappush(self._heap, (now, device_id))
+                continue
+
+            entry['device'] = device
+            if entry['due_at'] is None:
+                # Popped for a check whose batch failed; retry it now
+                self._schedule(device_id, entry, now)
+            if entry['base_interval'] != base_interval:
+                entry['base_interval'] = base_interval
+                entry['interval'] = min(entry['interval'], base_interval)
+                self._schedule(device_id, entry, min(entry['due_at'], now + entry['interval']))
+
+        for device_id in set(self._entries) - seen:
+            del self._entries[device_id]
+
+    def _base_interval(self, interval):
+        """A group's check interval, at least min_interval; the default when unset or not a positive number"""
+        if isinstance(interval, bool) or not isinstance(interval, (int, float)) or interval <= 0:
+            return self.default_interval
+        return max(interval, self.min_interval)
+
+    def _schedule(self, device_id, entry, due_at):
+        entry['due_at'] = due_at
+        heapq.heappush(self._heap, (due_at, device_id))
+
+    def next_due(self):
+        """Return when the next device is due, or None if nothing is scheduled"""
+        while self._heap:
+            due_at, device_id = self._heap[0]
+            entry = self._entries.get(device_id)
+            if entry is not None and entry['due_at'] == due_at:
+                return due_at
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now=None):
+        """Remove and return (device, due_at) for every device due by now"""
+        now = time.time() if now is None else now
+        due = []
+        while self.next_due() is not None and self._heap[0][0] <= now:
+            due_at, device_id = heapq.heappop(self._heap)
+            entry = self._entries[device_id]
+            entry['due_at'] = None
+            due.append((entry['device'], due_at))
+        return due
+
+    def record(self, device_id, status, now=None):
+        """Reschedule a checked device; returns True if its status changed"""
+        entry = self._entries.get(device_id)
+        if entry is None:
+            return False
+        now = time.time() if now is None else now
+
+        changed = status != entry['status']
+        entry['status'] = status
+        if changed:
+            entry['interval'] = self.min_interval
+        else:
+            limit = self.stable_backoff_limit if status == 'online' else self.offline_backoff_limit
+            ceiling = max(entry['base_interval'], min(entry['base_interval'] * limit, self.max_interval))
+            entry['interval'] = min(entry['interval'] * self.backoff, ceiling)
+        self._schedule(device_id, entry, now + entry['interval'])
+        return changed
+
 class DeviceMonitor:
     """Background monitoring service for device status"""
     
@@ -314,12 +1452,21 @@ class DeviceMonitor:
         self.scanner = NetworkScanner()
         self.is_monitoring = False
         self.monitor_thread = None
-        self.check_interval = 300  # 5 minutes
+        self.check_interval = 300  # 5 minutes, default for groups without their own
+        self.ping_timeout = 3
+        self.device_refresh_interval = 60  # how often new devices and group settings are picked up
+        self.rollup_interval = 60  # how often raw status samples are rolled up
+        self.scheduler = PollingScheduler(default_interval=self.check_interval)
+        self._stop_event = threading.Event()
+        self.last_cycle = None
+        self.cycles_completed = 0
+        self.cycles_overrun = 0
         
     def start_monitoring(self):
         """Start background monitoring"""
         if not self.is_monitoring:
             self.is_monitoring = True
+            self._stop_event.clear()
             self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
             self.monitor_thread.start()
             logger.info("Device monitoring started")
@@ -327,38 +1474,127 @@ class DeviceMonitor:
     def stop_monitoring(self):
         """Stop background monitoring"""
         self.is_monitoring = False
+        self._stop_event.set()
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
         logger.info("Device monitoring stopped")
     
+    def _refresh_schedule(self):
+        """Sync the scheduler with the current device list and group intervals"""
+        self.scheduler.default_interval = self.check_interval
+        group_intervals = {
+            group['id']: group.get('check_interval')
+            for group in self.db.get_device_groups()
+        }
+        self.scheduler.sync(self.db.get_all_devices(), group_intervals)
+    
     def _monitor_loop(self):
-        """Main monitoring loop"""
+        """Main monitoring loop: check devices as they fall due"""
+        next_refresh = 0
+        next_rollup = 0
         while self.is_monitoring:
             try:
-                self.check_all_devices()
-                time.sleep(self.check_interval)
+                now = time.time()
+                if now >= next_refresh:
+                    self._refresh_schedule()
+                    next_refresh = now + self.device_refresh_interval
+                
+                if now >= next_rollup:
+                    next_rollup = now + self.rollup_interval
+                    try:
+                        self.db.rollup_status_samples()
+                    except Exception as e:
+                        logger.error(f"Error rolling up status samples: {e}")
+                
+                due = self.scheduler.pop_due(now)
+                if due:
+                    self.check_devices(
+                        [device for device, _ in due],
+                        behind_by=now - min(due_at for _, due_at in due)
+                    )
+                
+                next_due = self.scheduler.next_due()
+                wake_at = min(next_refresh, next_rollup) if next_due is None else min(next_due, next_refresh, next_rollup)
+                self._stop_event.wait(max(0, wake_at - time.time()))
             except Exception as e:
                 logger.error(f"Error in monitoring loop: {e}")
-                time.sleep(30)  # Short sleep before retry
+                self._stop_event.wait(30)  # Short sleep before retry
     
     def check_all_devices(self):
-        """Check status of all known devices"""
-        devices = self.db.get_all_devices()
+        """Check status of all known devices concurrently and log them in one batch"""
+        return self.check_devices(self.db.get_all_devices())
+    
+    def check_devices(self, devices, behind_by=0):
+        """Probe devices concurrently, log the results in one batch and reschedule them.
+
+        `behind_by` is how late the most overdue device was when the batch
+        started; it is reported as the batch's overrun.
+        """
+        started_at = time.time()
         
         logger.info(f"Checking status of {len(devices)} devices")
         
-        for device in devices:
-            if not self.is_monitoring:
-                break
-                
-            try:
-                result = self.scanner.ping_host(device['ip_address'], timeout=3)
-                self.db.log_device_status(
-                    device['id'],
-                    result['status'],
-                    result['response_time']
-                )
-            except Exception as e:
-                logger.error(f"Error checking device {device['ip_address']}: {e}")
+        devices_by_ip = {device['ip_address']: device for device in devices}
+        results = self.scanner.ping_sweep(devices_by_ip, timeout=self.ping_timeout)
+        
+        self.db.log_device_statuses(
+            (devices_by_ip[result['ip']]['id'], result['status'], result['response_time'])
+            for result in results
+        )
+        
+        finished_at = time.time()
+        changed = sum(
+            1 for result in results
+            if self.scheduler.record(devices_by_ip[result['ip']]['id'], result['status'], finished_at)
+        )
+        
+        # Fill in hostnames for devices discovered without one, and MAC
+        # addresses learned (or changed) by ARP probes, as scans do
+        unnamed = [
+            result['ip'] for result in results
+            if result['status'] == 'online' and not devices_by_ip[result['ip']]['hostname']
+        ]
+        hostnames = self.scanner.get_hostnames(unnamed) if unnamed else {}
+        for result in results:
+            hostname = hostnames.get(result['ip'])
+            mac_address = result.get('mac_address')
+            if mac_address == devices_by_ip[result['ip']].get('mac_address'):
+                mac_address = None
+            if hostname or mac_address:
+                self.db.add_device(result['ip'], hostname, mac_address)
         
-        logger.info("Device status check completed")
\ No newline at end of file
+        duration = time.time() - started_at
+        online = sum(1 for result in results if result['status'] == 'online')
+        self.last_cycle = {
+            'started_at': started_at,
+            'duration': duration,
+            'devices_checked': len(results),
+            'online': online,
+            'offline': len(results) - online,
+            'changed': changed,
+            'overrun': max(0, behind_by)
+        }
+        self.cycles_completed += 1
+        
+        if self.last_cycle['overrun'] > self.scheduler.min_interval:
+            self.cycles_overrun += 1
+            logger.warning(
+                f"Device status check is {self.last_cycle['overrun']:.1f}s behind schedule "
+                f"({len(results)} devices in {duration:.1f}s)"
+            )
+        else:
+            logger.info(f"Device status check completed in {duration:.1f}s")
+        
+        return self.last_cycle
+    
+    def get_status(self):
+        """Report monitoring state and the timing of the last cycle"""
+        return {
+            'is_monitoring': self.is_monitoring,
+            'check_interval': self.check_interval,
+            'scheduled_devices': len(self.scheduler),
+            'next_check_at': self.scheduler.next_due(),
+            'cycles_completed': self.cycles_completed,
+            'cycles_overrun': self.cycles_overrun,
+            'last_cycle': self.last_cycle
+        }
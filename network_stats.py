@@ -0,0 +1,175 @@
+import datetime
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# How often the in-memory statistics are re-checked against the database
+STATS_RECONCILE_INTERVAL = 600
+
+# Entries in the recent status changes feed
+RECENT_CHANGES_SIZE = 10
+
+class NetworkStatistics:
+    """Network statistics kept in memory and updated from the event bus.
+
+    Holds the few fields statistics depend on for each device, and keeps
+    total/active counts, per-group counts and a ring buffer of recent status
+    changes in step with the device_added, device_updated, device_status and
+    group_added events DatabaseManager publishes. get_statistics() never
+    touches the database; reconcile() rebuilds everything from it on a slow
+    interval in case an event was missed.
+    """
+
+    def __init__(self, database_manager, event_bus, reconcile_interval=STATS_RECONCILE_INTERVAL,
+                 recent_changes_size=RECENT_CHANGES_SIZE):
+        self.db = database_manager
+        self.event_bus = event_bus
+        self.reconcile_interval = reconcile_interval
+        self.recent_changes_size = recent_changes_size
+        self.last_reconciled = None
+        self._devices = {}
+        self._groups = {}
+        self._group_counts = {}
+        self._active = 0
+        self._recent_changes = deque(maxlen=recent_changes_size)
+        self._replay = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Subscribe before the first load so nothing committed meanwhile is lost
+        self.event_bus.subscribe(self.handle_event)
+        self.reconcile()
+
+    def start(self):
+        """Start periodic reconciliation in a background thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._reconcile_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _reconcile_loop(self):
+        while not self._stop_event.wait(self.reconcile_interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"Error reconciling network statistics: {e}")
+
+    def reconcile(self):
+        """Rebuild the statistics from the database"""
+        # Events from here on may or may not be in what we read; replaying
+        # them afterwards is safe because applying one is idempotent
+        with self._lock:
+            self._replay = []
+        devices = self.db.get_device_states()
+        groups = self.db.get_device_groups()
+        recent_changes = self.db.get_recent_status_changes(self.recent_changes_size)
+
+        with self._lock:
+            previous = (len(self._devices), self._active)
+            self._devices = {}
+            self._group_counts = {}
+            self._active = 0
+            self._groups = {group['id']: {'name': group['name'], 'color': group['color']} for group in groups}
+            for device in devices:
+                self._set_device(device['id'], {
+                    'ip_address': device['ip_address'],
+                    'hostname': device['hostname'],
+                    'custom_name': device['custom_name'],
+                    'group_id': device['group_id'],
+                    'is_active': bool(device['is_active'])
+                })
+            self._recent_changes = deque(reversed(recent_changes), maxlen=self.recent_changes_size)
+
+            for event in self._replay:
+                self._apply(event, record_change=False)
+            self._replay = None
+
+            current = (len(self._devices), self._active)
+            if self.last_reconciled is not None and current != previous:
+                logger.warning(
+                    f"Network statistics drifted from the database: "
+                    f"{previous[0]} devices/{previous[1]} active in memory, {current[0]}/{current[1]} stored"
+                )
+            self.last_reconciled = datetime.datetime.now()
+
+    def handle_event(self, event):
+        """EventBus subscriber"""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(event)
+            self._apply(event)
+
+    def _apply(self, event, record_change=True):
+        data = event['data']
+        if event['type'] == 'group_added':
+            self._groups[data['group_id']] = {'name': data['name'], 'color': data['color']}
+            return
+
+        device = self._devices.get(data.get('device_id'))
+        if event['type'] == 'device_added':
+            if device is None:
+                self._set_device(data['device_id'], {
+                    'ip_address': data['ip_address'],
+                    'hostname': data.get('hostname'),
+                    'custom_name': None,
+                    'group_id': data.get('group_id'),
+                    'is_active': True
+                })
+        elif device is None:
+            # Only reconcile() can fill in a device we never heard of
+            return
+        elif event['type'] == 'device_updated':
+            self._set_device(data['device_id'], {
+                **device,
+                **{name: data[name] for name in ('hostname', 'custom_name', 'group_id') if name in data}
+            })
+        elif event['type'] == 'device_status':
+            self._set_device(data['device_id'], {**device, 'is_active': data['status'] == 'online'})
+            if record_change:
+                self._recent_changes.append({
+                    'ip_address': device['ip_address'],
+                    'hostname': device['hostname'],
+                    'custom_name': device['custom_name'],
+                    'status': data['status'],
+                    'timestamp': datetime.datetime.fromtimestamp(
+                        event['timestamp'], datetime.timezone.utc
+                    ).strftime('%Y-%m-%d %H:%M:%S')
+                })
+
+    def _set_device(self, device_id, state):
+        """Store a device's state, adjusting the counts by the difference"""
+        previous = self._devices.get(device_id)
+        if previous is not None:
+            self._active -= previous['is_active']
+            self._group_counts[previous['group_id']] -= 1
+        self._devices[device_id] = state
+        self._active += state['is_active']
+        self._group_counts[state['group_id']] = self._group_counts.get(state['group_id'], 0) + 1
+
+    def get_statistics(self):
+        """Same shape as DatabaseManager.get_network_statistics, without touching the database"""
+        with self._lock:
+            total_devices = len(self._devices)
+            devices_by_group = sorted(
+                (
+                    {'name': group['name'], 'count': self._group_counts.get(group_id, 0), 'color': group['color']}
+                    for group_id, group in self._groups.items()
+                ),
+                key=lambda group: group['count'],
+                reverse=True
+            )
+            return {
+                'total_devices': total_devices,
+                'active_devices': self._active,
+                'offline_devices': total_devices - self._active,
+                'devices_by_group': devices_by_group,
+                'recent_changes': list(reversed(self._recent_changes))
+            }
@@ -0,0 +1,74 @@
+import threading
+import time
+import logging
+
+from database import DEFAULT_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+# How often status history retention runs, and how long after startup the first run waits
+RETENTION_INTERVAL = 6 * 3600
+RETENTION_START_DELAY = 300
+
+class RetentionService:
+    """Applies status history retention in a background thread.
+
+    Each run calls DatabaseManager.apply_retention, which deletes in small
+    batches and vacuums incrementally, so it can run while the monitor and
+    web requests use the database. Groups set their own retention_days;
+    others keep `default_days`.
+    """
+
+    def __init__(self, database_manager, interval=RETENTION_INTERVAL, default_days=DEFAULT_RETENTION_DAYS,
+                 start_delay=RETENTION_START_DELAY):
+        self.db = database_manager
+        self.interval = interval
+        self.default_days = default_days
+        self.start_delay = start_delay
+        self.last_run = None
+        self.next_run_at = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start running retention in a background thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._retention_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop after the current batch"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _retention_loop(self):
+        delay = self.start_delay
+        while True:
+            self.next_run_at = time.time() + delay
+            if self._stop_event.wait(delay):
+                return
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error applying status history retention: {e}")
+            delay = self.interval
+
+    def run_once(self):
+        """Apply retention now and return what it removed"""
+        self.last_run = {
+            'started_at': time.time(),
+            **self.db.apply_retention(self.default_days, stop_event=self._stop_event)
+        }
+        return self.last_run
+
+    def get_status(self):
+        """Report the retention schedule and the result of the last run"""
+        return {
+            'interval': self.interval,
+            'default_days': self.default_days,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'next_run_at': self.next_run_at,
+            'last_run': self.last_run
+        }
@@ -0,0 +1,370 @@
+import heapq
+import ipaddress
+import itertools
+import threading
+import time
+import uuid
+import logging
+
+from network_scanner import ScanProgress, count_hosts
+
+logger = logging.getLogger(__name__)
+
+# Scans that run at once, and how many more may wait for a worker
+SCAN_WORKERS = 2
+MAX_QUEUED_JOBS = 32
+
+# Finished jobs kept for the status and results endpoints
+MAX_FINISHED_JOBS = 100
+
+# Discovered devices are saved once this many are waiting, and progress (with
+# whatever devices are waiting) is flushed to clients at most this often
+SCAN_INGEST_BATCH = 256
+SCAN_PROGRESS_INTERVAL = 0.5
+
+ACTIVE_STATES = ('queued', 'running')
+
+SCAN_TYPES = ('ping', 'nmap')
+
+# Largest range a scan may cover, as a prefix length (a /16 is 65,534 hosts)
+MIN_SCAN_PREFIX = 16
+
+def _subtract(network, exclude):
+    """`network` minus the `exclude` networks, as a list of disjoint networks"""
+    remaining = [network]
+    for excluded in ipaddress.collapse_addresses(exclude):
+        pieces = []
+        for piece in remaining:
+            if piece.subnet_of(excluded):
+                continue
+            if excluded.subnet_of(piece):
+                pieces.extend(piece.address_exclude(excluded))
+            else:
+                pieces.append(piece)
+        remaining = pieces
+    return remaining
+
+class ScanQueueFull(Exception):
+    """Raised when MAX_QUEUED_JOBS scans are already waiting"""
+
+class ScanJob:
+    """One requested scan and everything the endpoints report about it"""
+
+    def __init__(self, network, scan_type, priority, exclude=(), covered_by=(), follow_up_of=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.network = network
+        self.scan_type = scan_type
+        self.priority = priority
+        # Parts of `network` already queued or running in other jobs
+        self.exclude = list(exclude)
+        self.covered_by = list(covered_by)
+        # Job whose unscanned range this one was queued to cover
+        self.follow_up_of = follow_up_of
+        self.state = 'queued'
+        self.error = None
+        self.progress = ScanProgress(str(network), scan_type)
+        self.progress.hosts_total = count_hosts(network, self.exclude)
+        self.devices = []
+        self.cancel_event = threading.Event()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def covers(self):
+        """The parts of `network` this job scans itself"""
+        return _subtract(self.network, self.exclude)
+
+    def set_exclude(self, exclude):
+        self.exclude = list(exclude)
+        self.progress.hosts_total = count_hosts(self.network, self.exclude)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'network_range': str(self.network),
+            'scan_type': self.scan_type,
+            'priority': self.priority,
+            'state': self.state,
+            'error': self.error,
+            'covered_by': self.covered_by,
+            'follow_up_of': self.follow_up_of,
+            'progress': self.progress.to_dict(),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class ScanJobManager:
+    """Queue of scan jobs run by a bounded pool of worker threads.
+
+    Jobs are taken highest priority first, then oldest first. A submitted
+    range that overlaps queued or running scans of the same type skips the
+    addresses those jobs scan themselves, and one that lies wholly within
+    what a single job scans is answered with that job. When a job is
+    cancelled or fails, the addresses other jobs skipped because of it are
+    handed back to them. Progress and results are saved
+    and pushed while a job runs through `emit(event, data)`.
+    """
+
+    def __init__(self, scanner, database_manager, emit=None, workers=SCAN_WORKERS,
+                 max_queued=MAX_QUEUED_JOBS):
+        self.scanner = scanner
+        self.db = database_manager
+        self.emit = emit or (lambda event, data: None)
+        self.workers = workers
+        self.max_queued = max_queued
+        self._jobs = {}
+        self._queue = []
+        self._order = itertools.count()
+        self._threads = []
+        self._condition = threading.Condition()
+
+    def submit(self, network_range=None, scan_type='ping', priority=0):
+        """Queue a scan and return its job (or the running job that already covers it).
+
+        Raises ValueError for an unknown scan type, an invalid range, or a
+        range with a shorter prefix than MIN_SCAN_PREFIX.
+        """
+        if scan_type not in SCAN_TYPES:
+            raise ValueError(f"Unknown scan type {scan_type!r}, expected one of {', '.join(SCAN_TYPES)}")
+        try:
+            network = ipaddress.IPv4Network(network_range or self.scanner.local_network, strict=False)
+        except ValueError as e:
+            raise ValueError(f"Invalid network range: {e}")
+        if network.prefixlen < MIN_SCAN_PREFIX:
+            raise ValueError(
+                f"{network} has {network.num_addresses} addresses; scans are limited to a /{MIN_SCAN_PREFIX}"
+            )
+        with self._condition:
+            active = [
+                job for job in self._jobs.values()
+                if job.state in ACTIVE_STATES and job.scan_type == scan_type and job.network.overlaps(network)
+            ]
+            covered = {}
+            for job in active:
+                pieces = job.covers
+                if any(network.subnet_of(piece) for piece in pieces):
+                    logger.info(f"Scan of {network} is already covered by job {job.id}")
+                    return job
+                # Disjoint networks never partly overlap, so what is left overlaps by nesting
+                inside = [piece for piece in pieces if piece.subnet_of(network)]
+                if inside:
+                    covered[job.id] = (job, inside)
+
+            if sum(job.state == 'queued' for job in self._jobs.values()) >= self.max_queued:
+                raise ScanQueueFull(f"{self.max_queued} scans are already queued")
+
+            job = ScanJob(
+                network, scan_type, priority,
+                exclude=[piece for _, inside in covered.values() for piece in inside],
+                covered_by=[
+                    {'job_id': other.id, 'network_range': str(other.network)} for other, _ in covered.values()
+                ]
+            )
+            # Built before the job is registered, so a bad priority leaves nothing behind
+            entry = (-priority, next(self._order), job.id)
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, entry)
+            self._ensure_workers()
+            self._condition.notify()
+
+        self.emit('scan_status', {
+            'job_id': job.id,
+            'status': 'queued',
+            'message': f'Queued {scan_type} scan of {network}'
+        })
+        return job
+
+    def get(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._condition:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or stop a running one after its in-flight probes.
+
+        A running scan starts no new probes (or nmap shards) once cancelled;
+        the ones already in flight finish and what they find is saved.
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in ACTIVE_STATES:
+                return job
+            job.cancel_event.set()
+            if job.state == 'queued':
+                # Left in the heap; workers skip it when it comes up
+                self._finish(job, 'cancelled')
+        return job
+
+    def _ensure_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                _, _, job_id = heapq.heappop(self._queue)
+                job = self._jobs.get(job_id)
+                if job is None or job.state != 'queued':
+                    continue
+                job.state = 'running'
+                job.started_at = time.time()
+
+            try:
+                self._run(job)
+            except Exception as e:
+                logger.error(f"Scan job {job.id} failed: {e}")
+                with self._condition:
+                    job.error = str(e)
+                    self._finish(job, 'failed')
+                self.emit('scan_status', {
+                    'job_id': job.id,
+                    'status': 'error',
+                    'message': f'Scan failed: {str(e)}'
+                })
+
+    def _finish(self, job, state):
+        job.state = state
+        job.finished_at = time.time()
+        job.progress.finished_at = job.progress.finished_at or job.finished_at
+
+        if state in ('cancelled', 'failed'):
+            self._release(job)
+
+        finished = [other for other in self._jobs.values() if other.state not in ACTIVE_STATES]
+        if len(finished) > MAX_FINISHED_JOBS:
+            for other in sorted(finished, key=lambda other: other.finished_at)[:-MAX_FINISHED_JOBS]:
+                del self._jobs[other.id]
+
+    def _release(self, job):
+        """Hand the addresses a cancelled or failed job left unscanned back to the jobs that skipped them.
+
+        Each released range goes to the oldest active job that skipped it. A
+        queued job simply stops excluding it; a running one has already
+        planned its addresses, so the range is queued as a follow-up job
+        with the same type and priority. A follow-up that fails in turn is
+        not queued again, so a range that cannot be scanned does not loop.
+        """
+        pieces = job.covers
+        waiting = sorted(
+            (
+                other for other in self._jobs.values()
+                if other.state in ACTIVE_STATES and other.scan_type == job.scan_type
+                and any(entry['job_id'] == job.id for entry in other.covered_by)
+            ),
+            key=lambda other: other.created_at
+        )
+        owners = []  # (network, job) for released ranges already handed over
+        for other in waiting:
+            other.covered_by = [entry for entry in other.covered_by if entry['job_id'] != job.id]
+            # Ranges an older job took over are still skipped, now on that job's account
+            for network, owner in owners:
+                if any(excluded.subnet_of(network) for excluded in other.exclude) and not any(
+                        entry['job_id'] == owner.id for entry in other.covered_by):
+                    other.covered_by.append({'job_id': owner.id, 'network_range': str(owner.network)})
+
+            released = [
+                excluded for excluded in other.exclude
+                if any(excluded.subnet_of(piece) for piece in pieces)
+            ]
+            if not released:
+                continue
+            pieces = [rest for piece in pieces for rest in _subtract(piece, released)]
+            if other.state == 'queued':
+                other.set_exclude(excluded for excluded in other.exclude if excluded not in released)
+                owners.extend((network, other) for network in released)
+                logger.info(f"Scan job {other.id} takes over {', '.join(map(str, released))} from job {job.id}")
+                continue
+            if job.follow_up_of is not None:
+                logger.warning(f"{', '.join(map(str, released))} left unscanned by follow-up job {job.id}")
+                continue
+            for network in released:
+                follow_up = ScanJob(network, other.scan_type, other.priority, follow_up_of=job.id)
+                self._jobs[follow_up.id] = follow_up
+                heapq.heappush(self._queue, (-other.priority, next(self._order), follow_up.id))
+                other.covered_by.append({'job_id': follow_up.id, 'network_range': str(network)})
+                owners.append((network, follow_up))
+                logger.info(f"Queued job {follow_up.id} for {network}, left unscanned by job {job.id}")
+            self._ensure_workers()
+            self._condition.notify_all()
+
+    def _run(self, job):
+        """Scan a job's range, saving and pushing devices in batches as they are found"""
+        progress = job.progress
+        pending = []
+        last_reported = [None]
+        flush_lock = threading.Lock()
+        scan_done = threading.Event()
+
+        def flush(scan_meta=None):
+            """Save waiting devices and push them to clients with the progress counters"""
+            with flush_lock:
+                batch = pending[:]
+                del pending[:]
+                if batch or scan_meta:
+                    self.db.ingest_scan_results(batch, scan_meta)
+                job.devices.extend(batch)
+
+                counters = (progress.probes_done, progress.devices_found)
+                if batch or counters != last_reported[0]:
+                    last_reported[0] = counters
+                    self.emit('scan_progress', {
+                        'job_id': job.id,
+                        **progress.to_dict(),
+                        'devices': [device_info['ip_address'] for device_info in batch]
+                    })
+
+        def report_progress():
+            while not scan_done.wait(SCAN_PROGRESS_INTERVAL):
+                flush()
+
+        self.emit('scan_status', {
+            'job_id': job.id,
+            'status': 'started',
+            'message': f'Starting {job.scan_type} scan of {job.network}...'
+        })
+
+        reporter = threading.Thread(target=report_progress, daemon=True)
+        reporter.start()
+        try:
+            for device_info in self.scanner.iter_scan(
+                str(job.network), job.scan_type, progress,
+                exclude=job.exclude, cancel_event=job.cancel_event
+            ):
+                with flush_lock:
+                    pending.append(device_info)
+                    batch_full = len(pending) >= SCAN_INGEST_BATCH
+                if batch_full:
+                    flush()
+        finally:
+            scan_done.set()
+            reporter.join()
+
+        # Save the remainder together with the scan record
+        flush({
+            'scan_type': job.scan_type,
+            'network_range': str(job.network),
+            'devices_found': progress.devices_found,
+            'duration': progress.to_dict()['elapsed']
+        })
+
+        cancelled = job.cancel_event.is_set()
+        with self._condition:
+            self._finish(job, 'cancelled' if cancelled else 'completed')
+
+        self.emit('scan_status', {
+            'job_id': job.id,
+            'status': job.state,
+            'message': f"Scan {'cancelled' if cancelled else 'completed'}! Found {progress.devices_found} devices.",
+            'devices_found': progress.devices_found,
+            'duration': progress.to_dict()['elapsed']
+        })
@@ -5,6 +5,10 @@ class NetworkDashboard {
         this.isConnected = false;
         this.deviceUpdateInterval = null;
         
+        // Event bus position the page was rendered at; deltas after it are applied
+        this.eventEpoch = Number(document.body.dataset.eventEpoch) || null;
+        this.lastEventSeq = Number(document.body.dataset.eventSeq) || 0;
+        
         this.init();
     }
     
@@ -30,6 +34,9 @@ class NetworkDashboard {
                 this.isConnected = true;
                 this.updateConnectionStatus(true);
                 console.log('Connected to server');
+                
+                // Catch up on whatever changed while the page loaded or the socket was down
+                this.resync(this.lastEventSeq);
             });
             
             this.socket.on('disconnect', () => {
@@ -46,6 +53,17 @@ class NetworkDashboard {
                 this.updateDeviceStatus(data.devices);
             });
             
+            this.socket.on('device_deltas', (data) => {
+                this.applyDeltas(data);
+            });
+            
+            this.socket.on('snapshot', (data) => {
+                this.eventEpoch = data.epoch;
+                this.lastEventSeq = data.seq;
+                this.updateDeviceStatus(data.devices);
+                this.updateDashboardStats(data.stats);
+            });
+            
             this.socket.on('scan_status', (data) => {
                 if (window.updateScanStatus) {
                     window.updateScanStatus(data);
@@ -155,6 +173,42 @@ class NetworkDashboard {
         }
     }
     
+    resync(since) {
+        const table = document.querySelector('[data-status-query]');
+        this.socket.emit('resync', {
+            epoch: this.eventEpoch,
+            since: since,
+            query: table ? table.dataset.statusQuery : ''
+        });
+    }
+    
+    applyDeltas(data) {
+        if (!data.events.length) return;
+        
+        // A new server process or a gap in sequence numbers means we missed
+        // something; ask for it instead of applying out of order
+        if (data.epoch !== this.eventEpoch || data.events[0].seq > this.lastEventSeq + 1) {
+            this.resync(data.epoch === this.eventEpoch ? this.lastEventSeq : null);
+            return;
+        }
+        
+        const changed = [];
+        data.events.forEach(event => {
+            if (event.seq <= this.lastEventSeq) return;
+            this.lastEventSeq = event.seq;
+            
+            if (event.type === 'device_status') {
+                const online = event.data.status === 'online';
+                changed.push({
+                    id: event.data.device_id,
+                    is_active: online,
+                    last_seen: online ? new Date(event.timestamp * 1000).toISOString() : null
+                });
+            }
+        });
+        this.updateDeviceStatus(changed);
+    }
+    
     updateDeviceStatus(devices) {
         // Update device status indicators in tables
         devices.forEach(device => {
@@ -188,19 +242,24 @@ class NetworkDashboard {
     }
     
     startPeriodicUpdates() {
-        // Update device status every 30 seconds if not using websockets
+        // Changes are pushed over Socket.IO; poll only when it is unavailable
         if (!this.socket) {
             this.deviceUpdateInterval = setInterval(() => {
                 this.refreshDeviceStatus();
+                window.refreshStats();
             }, 30000);
         }
     }
     
     refreshDeviceStatus() {
-        fetch('/api/devices/status')
+        // Ask for the same page of devices the table is showing
+        const table = document.querySelector('[data-status-query]');
+        if (!table) return;
+        
+        fetch(`/api/devices/status?${table.dataset.statusQuery}`)
             .then(response => response.json())
-            .then(devices => {
-                this.updateDeviceStatus(devices);
+            .then(page => {
+                this.updateDeviceStatus(page.devices);
             })
             .catch(error => {
                 console.error('Error refreshing device status:', error);
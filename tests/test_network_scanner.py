@@ -0,0 +1,48 @@
+import threading
+import time
+
+from benchmark import VirtualNetwork, simulated_scanner
+from network_scanner import CONNECT_CONCURRENCY, _connect_slots
+
+
+def test_abandoned_sweep_releases_connect_slots():
+    # Most hosts only time out, so a /20 queues far more TCP probes than there are slots
+    scanner = simulated_scanner(VirtualNetwork(up_ratio=0.05, tcp_ratio=0.05, seed=3), time_scale=0.05)
+    sweep = scanner.iter_scan('10.1.0.0/20', timeout=2)
+    next(sweep)
+    assert _connect_slots.in_use == CONNECT_CONCURRENCY
+    sweep.close()
+
+    assert _connect_slots.in_use == 0
+    assert _connect_slots.waiting == 0
+
+    # The monitor path still gets slots afterwards
+    started = time.time()
+    results = scanner.ping_sweep([f'10.2.0.{host}' for host in range(1, 51)], timeout=2)
+    assert len(results) == 50
+    assert time.time() - started < 5
+
+
+def test_connect_slots_are_shared_across_loops():
+    scanner = simulated_scanner(VirtualNetwork(up_ratio=0, tcp_ratio=1, loss=0, seed=5), time_scale=0.05)
+    peak = [0]
+    lock = threading.Lock()
+    tcp_alive = scanner.async_scanner._tcp_alive
+
+    async def counted(ip_address, port, timeout):
+        with lock:
+            peak[0] = max(peak[0], _connect_slots.in_use)
+        return await tcp_alive(ip_address, port, timeout)
+
+    scanner.async_scanner._tcp_alive = counted
+    sweeps = [
+        threading.Thread(target=scanner.ping_sweep, args=([f'10.3.{block}.{host}' for host in range(1, 255)],))
+        for block in range(4)
+    ]
+    for sweep in sweeps:
+        sweep.start()
+    for sweep in sweeps:
+        sweep.join()
+
+    assert peak[0] <= CONNECT_CONCURRENCY
+    assert _connect_slots.in_use == 0
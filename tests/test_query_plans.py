@@ -0,0 +1,64 @@
+import re
+
+import pytest
+
+from database import DatabaseManager
+
+# The index each hot query must use; a different one means its plan regressed
+EXPECTED_INDEXES = {
+    'device_status_history': 'idx_status_logs_device_time',
+    'recent_status_changes': 'idx_status_logs_time',
+    'devices_by_group': 'idx_devices_group_ip',
+    'retention_status_logs': 'idx_status_logs_device_time',
+    'retention_status_intervals': 'idx_status_intervals_device_since',
+    'device_timeline': 'idx_status_intervals_device_since',
+    'rollup_retention': 'idx_status_rollups_bucket',
+    'raw_sample_retention': 'idx_status_samples_ts_rtt',
+    'sla_samples': 'idx_status_samples_ts_rtt',
+    'devices_page': 'idx_devices_ip',
+    'devices_page_by_name': 'idx_devices_name',
+    'devices_page_by_last_seen': 'idx_devices_last_seen',
+    'devices_in_range': 'idx_devices_ip',
+    'devices_page_by_group': 'idx_devices_group_ip',
+}
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(status_logs|status_intervals|status_samples|devices|sl|d)\b(?! USING)')
+
+
+@pytest.fixture(params=['empty', 'analyzed'])
+def db(tmp_path, request):
+    """A migrated database, empty or holding some history with planner statistics"""
+    db = DatabaseManager(str(tmp_path / 'network_monitor.db'))
+    if request.param == 'analyzed':
+        db.ingest_scan_results([
+            {'ip_address': f'10.0.{host // 250}.{host % 250 + 1}', 'hostname': f'host-{host}', 'status': 'online'}
+            for host in range(500)
+        ])
+        device_ids = [device['id'] for device in db.get_all_devices()]
+        for check in range(6):
+            db.log_device_statuses(
+                (device_id, 'online' if (device_id + check) % 4 else 'offline', 1.5) for device_id in device_ids
+            )
+        db.rollup_status_samples()
+        with db.get_connection() as conn:
+            conn.execute("ANALYZE")
+            conn.commit()
+    yield db
+    db.close()
+
+
+def test_hot_queries_have_no_plan_problems(db):
+    report = db.check_query_plans()
+    assert {name: result['problems'] for name, result in report.items() if result['problems']} == {}
+
+
+def test_hot_queries_never_scan_large_tables(db):
+    for name, result in db.check_query_plans().items():
+        scans = [detail for detail in result['plan'] if FULL_SCAN.match(detail)]
+        assert scans == [], name
+
+
+def test_hot_queries_use_their_indexes(db):
+    report = db.check_query_plans()
+    for name, index in EXPECTED_INDEXES.items():
+        assert any(index in detail for detail in report[name]['plan']), (name, report[name]['plan'])